@@ -0,0 +1,4 @@
+import sys
+import sarewt.cli
+
+sys.exit(sarewt.cli.main())
@@ -0,0 +1,268 @@
+import os
+import asyncio
+import functools
+import threading
+import collections
+import multiprocessing
+import numpy as np
+import concurrent.futures
+
+import sarewt.data_reader as dare
+import sarewt.ragged as ra
+
+EXECUTOR_KINDS = ('thread', 'process')
+
+_executor = None
+_executor_lock = threading.Lock()
+_executor_kind = 'thread'
+_max_concurrency = min(32, os.cpu_count() or 1)
+
+
+def shutdown_executor(wait=True):
+    ''' shut down executor shared by all async readers (a new one is started by the next read) '''
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
+
+
+def set_max_concurrency(n):
+    ''' set process-wide limit of concurrently running reads (worker threads or processes) shared by all async readers '''
+    global _max_concurrency
+    shutdown_executor(wait=False)
+    _max_concurrency = int(n)
+
+
+def get_max_concurrency():
+    return _max_concurrency
+
+
+def set_executor_kind(kind):
+    '''
+    run reads of all async readers in worker threads ('thread', default) or in spawned worker processes ('process')
+    threads: h5py holds a global lock during every dataset read, s.t. hdf5 I/O and decompression of concurrent reads
+    is serialized, decoding and cuts (numpy) overlap and the event loop is never blocked
+    processes: hdf5 I/O and decompression overlap, but reader and results are pickled (results are held twice until
+    unpickled, large constituents reads pay the copy) and scripts must guard their entry point with
+    if __name__ == "__main__": (workers are spawned since hdf5 is not fork-safe)
+    '''
+    global _executor_kind
+    if kind not in EXECUTOR_KINDS:
+        raise ValueError('invalid executor kind {}, expected one of {}'.format(kind, EXECUTOR_KINDS))
+    shutdown_executor(wait=False)
+    _executor_kind = kind
+
+
+def get_executor():
+    ''' bounded thread or process pool executor shared by all async readers (see set_executor_kind) '''
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if _executor_kind == 'process':
+                _executor = concurrent.futures.ProcessPoolExecutor(max_workers=_max_concurrency, mp_context=multiprocessing.get_context('spawn'))
+            else:
+                _executor = concurrent.futures.ThreadPoolExecutor(max_workers=_max_concurrency, thread_name_prefix='sarewt-async-reader')
+        return _executor
+
+
+async def run_in_executor(func, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def call_reader(reader, method, *args, **kwargs):
+    '''
+    call reader method in worker process: reader is a pickled private copy whose file pool holds no handles,
+    files opened by the call are closed before returning (handles of the caller's pool are never touched)
+    '''
+    try:
+        return getattr(reader, method)(*args, **kwargs)
+    finally:
+        reader.close()
+
+
+class AsyncDataReader():
+    '''
+        asyncio interface of DataReader (or CaseDataReader): hdf5 reading, decoding and cuts of each file run on the
+        bounded executor shared by all async readers (see set_max_concurrency, set_executor_kind), s.t. many samples
+        are loaded concurrently without blocking the event loop or oversubscribing cores
+        worker threads share the file pool of the wrapped reader (handles checked out per read), worker processes
+        read with a private copy of the reader
+        chunk generators read up to prefetch files ahead of the consumer
+    '''
+
+    def __init__(self, reader):
+        self.reader = dare.DataReader(reader) if isinstance(reader, str) else reader
+
+
+    @property
+    def path(self):
+        return self.reader.path
+
+
+    def close(self):
+        self.reader.close()
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    async def call(self, method, *args, **kwargs):
+        ''' await reader method run on executor '''
+        if _executor_kind == 'process':
+            return await run_in_executor(call_reader, self.reader, method, *args, **kwargs)
+        return await run_in_executor(getattr(self.reader, method), *args, **kwargs)
+
+
+    async def read_file_contents(self, method, flist, path_kwarg=None, **cuts):
+        ''' read all files of flist concurrently with reader method, return results in order of flist (unreadable files skipped) '''
+        calls = [self.call(method, **{path_kwarg: fname}, **cuts) if path_kwarg else self.call(method, fname, **cuts) for fname in flist]
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        contents = []
+        for fname, res in zip(flist, results):
+            if isinstance(res, (OSError, IndexError, KeyError)):
+                print("\nCould not read file ", fname, ': ', repr(res))
+            elif isinstance(res, BaseException):
+                raise res
+            else:
+                contents.append(res)
+        return contents
+
+
+    async def iterate_file_contents(self, method, flist, prefetch=2, **cuts):
+        '''
+        yield results of reader method for files of flist in order, reading up to prefetch files ahead
+        (reads not started yet are cancelled when the consumer stops early)
+        '''
+        pending = collections.deque()
+        try:
+            for fname in flist:
+                pending.append(asyncio.ensure_future(self.call(method, fname, **cuts)))
+                if len(pending) > prefetch:
+                    yield await pending.popleft()
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+    async def read_jet_features_from_dir(self, read_n=None, features_to_df=False, **cuts):
+        ''' async DataReader.read_jet_features_from_dir, files of the directory are read concurrently '''
+        if read_n is not None: # limited number of events: read sequentially to avoid reading files not needed
+            return await self.call('read_jet_features_from_dir', read_n=read_n, features_to_df=features_to_df, **cuts)
+
+        flist = await self.call('get_file_list')
+        features = await self.read_file_contents('read_jet_features_from_file', flist, path_kwarg='path', **cuts)
+        features = np.concatenate(features, axis=0)
+        dijet_feature_names, = await self.call('read_labels_from_dir', flist=flist, keylist=[self.reader.dijet_feature_names])
+        if features_to_df:
+            import pandas as pd
+            features = pd.DataFrame(features, columns=dijet_feature_names)
+        return [features, dijet_feature_names]
+
+
+    async def read_events_from_dir(self, read_n=None, features_to_df=False, **cuts):
+        ''' async DataReader.read_events_from_dir (CaseDataReader: read_case_events_from_dir), files of the directory are read concurrently '''
+        if isinstance(self.reader, dare.CaseDataReader):
+            if features_to_df or cuts:
+                raise TypeError('CaseDataReader.read_events_from_dir supports no cuts and no features_to_df')
+            return await self.read_case_events_from_dir(max_n=read_n)
+        if read_n is not None:
+            return await self.call('read_events_from_dir', read_n=read_n, features_to_df=features_to_df, **cuts)
+
+        flist = await self.call('get_file_list')
+        events = await self.read_file_contents('read_events_from_file', flist, **cuts)
+        constituents = np.concatenate([c for c, _ in events], axis=0)
+        features = np.concatenate([f for _, f in events], axis=0)
+        particle_feature_names, dijet_feature_names = await self.call('read_labels_from_dir', flist)
+        if features_to_df:
+            import pandas as pd
+            features = pd.DataFrame(features, columns=dijet_feature_names)
+        return [constituents, particle_feature_names, features, dijet_feature_names]
+
+
+    async def read_case_events_from_dir(self, max_n=None):
+        ''' async CaseDataReader.read_events_from_dir: constituents, particle feature names, features, feature names and truth labels '''
+        if max_n is not None:
+            return await self.call('read_events_from_dir', max_n=max_n)
+
+        flist = await self.call('get_file_list')
+        events = await self.read_file_contents('read_labeled_events_from_file', flist)
+        constituents, features, truth_labels = [np.concatenate([event[i] for event in events], axis=0) for i in range(3)]
+        return [constituents, self.reader.constituents_feature_names_val, features, self.reader.dijet_feature_names_val, truth_labels]
+
+
+    async def chunk_file_contents(self, contents, parts_n=None, parts_sz_mb=None, concatenate=np.concatenate):
+        ''' split stream of (constituents, features) file contents into parts of parts_n events (or parts_sz_mb size) '''
+        constituents_concat, features_concat = None, None
+        try:
+            async for constituents, features in contents:
+                if parts_n is None and parts_sz_mb and len(features):
+                    parts_n = self.reader.get_slice_of_size_stop_index(constituents, features, parts_sz_mb)
+                if features_concat is None:
+                    constituents_concat, features_concat = constituents, features
+                else:
+                    constituents_concat = concatenate([constituents_concat, constituents])
+                    features_concat = np.concatenate([features_concat, features], axis=0)
+
+                while parts_n and len(features_concat) >= parts_n:
+                    yield (constituents_concat[:parts_n], features_concat[:parts_n])
+                    constituents_concat, features_concat = constituents_concat[parts_n:], features_concat[parts_n:]
+        finally:
+            await contents.aclose() # cancel reads ahead if consumer stopped early
+
+        # if data left, yield it
+        if features_concat is not None and len(features_concat) > 0:
+            yield (constituents_concat, features_concat)
+
+
+    async def generate_event_parts_from_dir(self, parts_n=None, parts_sz_mb=None, prefetch=2, **cuts):
+        ''' async iterator over event chunks as DataReader.generate_event_parts_from_dir, up to prefetch files are read ahead concurrently '''
+        flist = await self.call('get_file_list')
+        contents = self.iterate_file_contents('read_events_from_file', flist, prefetch=prefetch, **cuts)
+        chunks = self.chunk_file_contents(contents, parts_n=int(parts_n) if parts_n else None, parts_sz_mb=parts_sz_mb)
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+
+    async def generate_constituents_parts_from_dir(self, parts_n=None, parts_sz_mb=None, prefetch=2, **cuts):
+        parts = self.generate_event_parts_from_dir(parts_n=parts_n, parts_sz_mb=parts_sz_mb, prefetch=prefetch, **cuts)
+        try:
+            async for constituents, _ in parts:
+                yield constituents
+        finally:
+            await parts.aclose()
+
+
+    async def generate_ragged_event_parts_from_dir(self, parts_n, pad=False, prefetch=2, **cuts):
+        flist = await self.call('get_file_list')
+        contents = self.iterate_file_contents('read_ragged_events_from_file', flist, prefetch=prefetch, **cuts)
+        chunks = self.chunk_file_contents(contents, parts_n=parts_n, concatenate=ra.RaggedConstituents.concatenate)
+        try:
+            async for constituents, features in chunks:
+                yield (constituents.to_padded(self.reader.constituents_shape[1]) if pad else constituents, features)
+        finally:
+            await chunks.aclose()
+
+
+    async def count_files_events_in_dir(self, recursive=False, **cuts):
+        return await self.call('count_files_events_in_dir', recursive=recursive, **cuts)
+
+
+async def read_jet_features_from_dirs(paths, **kwargs):
+    ''' read dijet features of many sample directories concurrently, return list of [features, feature names] in order of paths '''
+    readers = [AsyncDataReader(path) for path in paths]
+    try:
+        return await asyncio.gather(*[reader.read_jet_features_from_dir(**kwargs) for reader in readers])
+    finally:
+        for reader in readers:
+            reader.close()
@@ -0,0 +1,125 @@
+import sys
+import argparse
+
+# heavy modules (numpy, h5py, pandas, pyarrow) are imported inside the subcommands only,
+# s.t. startup of short jobs and of --help stays fast
+
+
+def get_cuts(args):
+    cuts = {}
+    if args.side:
+        cuts['sideband'] = 1.4
+    if args.sigreg:
+        cuts['signalregion'] = 1.4
+    return cuts
+
+
+def run_count(args):
+    import sarewt.scripts.count_number_sample_events as cnse
+    cnse.count_number_events_recursively(args.base_dir, **get_cuts(args))
+
+
+def run_concat(args):
+    import sarewt.event_concatenate_serialization as ecs
+    print('concatenating data in', args.indir)
+    if args.job:
+        summary = ecs.read_concat_write_job(args.indir, args.outfile, args.files_per_unit or 10, args.side, args.sigreg, args.encoding, args.n_workers or 1)
+        return 1 if summary['failed'] else 0
+    if args.append:
+        ecs.read_concat_append(args.indir, args.outfile, args.mb_sz, args.side, args.sigreg, args.encoding)
+    else:
+        ecs.read_concat_write(args.indir, args.outfile, args.num_evts or int(1e9), args.mb_sz, args.side, args.sigreg, args.encoding)
+
+
+def run_images(args):
+    import sarewt.event_to_image_serialization as eis
+    if args.job:
+        print('converting data in directory', args.infile)
+        summary = eis.convert_dir_to_images_job(args.infile, args.outfile, args.n_bins, args.num_evts, args.n_workers or 1)
+        return 1 if summary['failed'] else 0
+    print('converting data in file', args.infile)
+    serializer = eis.ImageSerializer(args.n_bins)
+    serializer.read_events_write_images(args.infile, args.outfile, args.num_evts)
+
+
+def run_materialize(args):
+    if args.what == 'index':
+        import sarewt.scripts.build_feature_index as bfi
+        bfi.build_feature_index(args.indir, args.n_bins)
+    elif args.what == 'parquet':
+        import sarewt.data_reader as dare
+        import sarewt.parquet_io as paio
+        reader = dare.CaseDataReader(args.indir) if args.case else dare.DataReader(args.indir)
+        with reader:
+            paio.export_features_to_parquet(reader, args.outdir)
+    elif args.what == 'ragged':
+        import sarewt.scripts.convert_to_ragged as ctr
+        ctr.convert_dir_to_ragged(args.indir, args.outdir)
+
+
+def add_cut_arguments(parser):
+    parser.add_argument('--side', dest='side', action='store_true', help='|dEta| > 1.4 sideband')
+    parser.add_argument('--signal', dest='sigreg', action='store_true', help='|dEta| <= 1.4  signalregion')
+
+
+def add_job_arguments(parser):
+    parser.add_argument('-j', dest='n_workers', type=int, help='number of parallel workers of resumable job, default 1 (more workers/nodes can run the same job concurrently)')
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog='sarewt', description='sample read, write and transform tools')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    count = subparsers.add_parser('count', help='count number of events and files in subdirectories of a directory')
+    count.add_argument('-d', dest='base_dir', type=str, required=True, help='input base directory')
+    add_cut_arguments(count)
+    count.set_defaults(func=run_count)
+
+    concat = subparsers.add_parser('concat', help='read, concatenate and write events from all files in directory')
+    concat.add_argument('-in', dest='indir', type=str, required=True, help='input directory')
+    concat.add_argument('-out', dest='outfile', type=str, default='out.h5', help='output file name/path')
+    concat.add_argument('-n', dest='num_evts', type=int, help='max number of events for output dataset (default: all)')
+    concat.add_argument('-mb', dest='mb_sz', type=int, help='split concatenated dataset in multiple files, each of size mb [MB]')
+    concat.add_argument('-enc', dest='encoding', type=str, help='jet constituents storage encoding: float16, fixed, trim or combined e.g. fixed+trim')
+    concat.add_argument('--append', dest='append', action='store_true', help='only append events of input files not yet concatenated into output')
+    concat.add_argument('--job', dest='job', action='store_true', help='resumable job: concatenate units of -fpu input files into file parts, skipping units completed before')
+    concat.add_argument('-fpu', dest='files_per_unit', type=int, help='number of input files per unit of resumable job (default: 10)')
+    add_job_arguments(concat)
+    add_cut_arguments(concat)
+    concat.set_defaults(func=run_concat)
+
+    images = subparsers.add_parser('images', help='transform event data to jet images')
+    images.add_argument('-in', dest='infile', type=str, required=True, help='input file name/path')
+    images.add_argument('-out', dest='outfile', type=str, default='out.h5', help='output file name/path')
+    images.add_argument('-bin', dest='n_bins', type=int, default=32, help='number of bins in jet image')
+    images.add_argument('-n', dest='num_evts', type=int, default=int(1e9), help='number of events for output dataset')
+    images.add_argument('--job', dest='job', action='store_true', help='resumable job: convert each file of input directory -in to output directory -out, skipping files converted before')
+    add_job_arguments(images)
+    images.set_defaults(func=run_images)
+
+    materialize = subparsers.add_parser('materialize', help='build derived data of a sample directory: feature index, parquet features or ragged constituents')
+    materialize.add_argument('what', choices=['index', 'parquet', 'ragged'], help='index: feature summaries for cut skipping, parquet: feature export, ragged: unpadded constituents')
+    materialize.add_argument('-in', dest='indir', type=str, required=True, help='input sample directory')
+    materialize.add_argument('-out', dest='outdir', type=str, help='output directory (parquet, ragged)')
+    materialize.add_argument('-bin', dest='n_bins', type=int, default=50, help='number of histogram bins per feature (index)')
+    materialize.add_argument('--case', dest='case', action='store_true', help='input in CASE layout (parquet)')
+    materialize.set_defaults(func=run_materialize)
+
+    return parser
+
+
+def main(argv=None):
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'materialize' and args.what != 'index' and not args.outdir:
+        parser.error('materialize {} requires -out'.format(args.what))
+    if args.command == 'concat':
+        import sarewt.event_concatenate_serialization as ecs
+        ecs.check_mode_arguments(parser, args)
+    if args.command == 'images' and args.n_workers is not None and not args.job:
+        parser.error('-j requires --job')
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+'''storage encodings of zero-padded jet constituents [N x 2 x n_particles x n_features]
+encoding spec: precision ('float32', 'float16' or 'fixed') optionally combined with '+trim', e.g. 'fixed+trim'
+    float16: all features stored as float16
+    fixed:   angular features (all but last, i.e. eta & phi) stored as int16 fixed point with symmetric per-feature scale
+             (zero padding stays exactly zero), pt stored as float32
+    trim:    zero padding dropped per jet: particles up to each jet's multiplicity stored flat [n_particles_total x n_features],
+             per-jet multiplicity [N x 2] stored to restore the padded layout
+'''
+
+import numpy as np
+
+PRECISIONS = ('float32', 'float16', 'fixed')
+MULTIPLICITY_SUFFIX = 'Multiplicity'
+FLOAT_FEATURES_SUFFIX = 'FloatFeatures'
+
+
+def parse_encoding(spec):
+    ''' return (precision, trim) of encoding spec '''
+    parts = [p for p in spec.split('+') if p]
+    trim = 'trim' in parts
+    precisions = [p for p in parts if p != 'trim']
+    if len(precisions) > 1 or (precisions and precisions[0] not in PRECISIONS):
+        raise ValueError('invalid constituents encoding {}, expected one of {} optionally combined with +trim'.format(spec, PRECISIONS))
+    return (precisions[0] if precisions else 'float32'), trim
+
+
+def get_multiplicity(constituents):
+    ''' number of particles per jet up to the last non-zero particle (padding at the end of particle axis) '''
+    filled = np.any(constituents != 0, axis=-1)
+    last = filled.shape[-1] - np.argmax(filled[..., ::-1], axis=-1)
+    return np.where(filled.any(axis=-1), last, 0)
+
+
+def get_particle_mask(multiplicity, n_particles):
+    ''' mask [... x n_particles] of particles within multiplicity of their jet '''
+    return np.arange(n_particles) < np.asarray(multiplicity)[..., None]
+
+
+def get_event_offsets(multiplicity):
+    ''' offsets of the particles of each event in flat trimmed data (length N+1) '''
+    multiplicity = np.asarray(multiplicity, dtype='int64')
+    return np.concatenate([[0], np.cumsum(multiplicity.reshape(len(multiplicity), -1).sum(axis=1))])
+
+
+def encode_constituents(constituents, spec):
+    '''
+    :return: encoded data, attributes of encoded dataset, dict of extra datasets (name suffix -> data)
+    '''
+    precision, trim = parse_encoding(spec)
+    constituents = np.asarray(constituents)
+    attrs = {'encoding': spec, 'n_particles': constituents.shape[-2], 'n_features': constituents.shape[-1]}
+    extras = {}
+
+    if trim:
+        multiplicity = get_multiplicity(constituents)
+        extras[MULTIPLICITY_SUFFIX] = multiplicity.astype('uint16')
+        constituents = constituents[get_particle_mask(multiplicity, constituents.shape[-2])] # flat particles of all jets
+
+    if precision == 'float16':
+        data = constituents.astype('float16')
+    elif precision == 'fixed':
+        angles = constituents[..., :-1]
+        scale = np.abs(angles).max(axis=tuple(range(angles.ndim - 1)), initial=0.) / np.iinfo('int16').max
+        scale = np.where(scale > 0, scale, 1.)
+        data = np.round(angles / scale).astype('int16')
+        attrs['scale'] = scale.astype('float64')
+        extras[FLOAT_FEATURES_SUFFIX] = constituents[..., -1:].astype('float32')
+    else:
+        data = constituents.astype('float32')
+
+    return data, attrs, extras
+
+
+def decode_constituents(data, attrs, extras, dtype='float32'):
+    '''
+    decode to dense zero-padded constituents of original shape
+    :param extras: dict of extra datasets (name suffix -> data) as written by encode_constituents
+    '''
+    precision, trim = parse_encoding(attrs['encoding'])
+    n_particles, n_features = int(attrs['n_particles']), int(attrs['n_features'])
+
+    if precision == 'fixed':
+        values = np.empty((*data.shape[:-1], n_features), dtype=dtype)
+        values[..., :-1] = data * np.asarray(attrs['scale'])
+        values[..., -1:] = extras[FLOAT_FEATURES_SUFFIX]
+    else:
+        values = np.asarray(data, dtype=dtype)
+
+    if not trim:
+        return values
+
+    multiplicity = extras[MULTIPLICITY_SUFFIX]
+    decoded = np.zeros((*multiplicity.shape, n_particles, n_features), dtype=dtype)
+    decoded[get_particle_mask(multiplicity, n_particles)] = values
+    return decoded
+
+
+def encoding_report(constituents, specs=('float16', 'fixed', 'trim', 'float16+trim', 'fixed+trim')):
+    '''
+    error and in-memory size of each encoding relative to float32 constituents
+    :return: list of dicts with spec, bytes, size ratio, max & mean absolute error per feature and max relative error of last feature (pt)
+    '''
+    constituents = np.asarray(constituents, dtype='float32')
+    report = []
+    for spec in specs:
+        data, attrs, extras = encode_constituents(constituents, spec)
+        decoded = decode_constituents(data, attrs, extras)
+        abs_err = np.abs(decoded - constituents)
+        flat_err = abs_err.reshape(-1, constituents.shape[-1])
+        pt = constituents[..., -1]
+        rel_err_pt = abs_err[..., -1][pt != 0] / np.abs(pt[pt != 0])
+        nbytes = data.nbytes + sum(e.nbytes for e in extras.values())
+        report.append({'spec': spec, 'bytes': nbytes, 'size_ratio': nbytes / constituents.nbytes,
+                       'max_abs_err': flat_err.max(axis=0).tolist(), 'mean_abs_err': flat_err.mean(axis=0).tolist(),
+                       'max_rel_err_pt': float(rel_err_pt.max(initial=0.))})
+    return report
@@ -0,0 +1,268 @@
+import os
+import json
+import time
+import socket
+import uuid
+import hashlib
+import threading
+import multiprocessing
+
+
+def file_checksum(path, block_sz=8*1024**2):
+    ''' sha256 hex digest of file content '''
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_sz), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def file_record(path, checksum=True):
+    stat = os.stat(path)
+    record = {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+    if checksum:
+        record['sha256'] = file_checksum(path)
+    return record
+
+
+def file_unchanged(record):
+    ''' does file still match its record? size and mtime first, checksum only if those changed (e.g. file copied or touched) '''
+    try:
+        stat = os.stat(record['path'])
+    except OSError:
+        return False
+    if stat.st_size != record['size']:
+        return False
+    return stat.st_mtime == record['mtime'] or file_checksum(record['path']) == record['sha256']
+
+
+def write_json_atomic(obj, path):
+    tmp_path = '{}.tmp.{}.{}'.format(path, socket.gethostname(), os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(obj, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def units_by_file(in_dir, out_dir, flist):
+    ''' one unit per input file, output mirrors directory structure of in_dir in out_dir '''
+    return [(os.path.relpath(fname, in_dir), [fname], os.path.join(out_dir, os.path.relpath(fname, in_dir))) for fname in flist]
+
+
+def units_by_group(flist, out_file, files_per_unit):
+    ''' units of files_per_unit consecutive input files, unit i written to file part <out_file>_<i>.<ext> '''
+    stem, ext = os.path.splitext(out_file)
+    groups = [flist[i:i+files_per_unit] for i in range(0, len(flist), files_per_unit)]
+    return [('{:03d}'.format(i), group, stem + '_{:03d}'.format(i) + ext) for i, group in enumerate(groups)]
+
+
+class UnitLock():
+    '''
+        exclusive claim of a unit by one worker (on any node sharing the file system): lock file created with O_EXCL,
+        kept alive by a heartbeat updating its mtime; locks without heartbeat for more than stale_after seconds
+        (worker preempted or killed) are broken: the stale lock is renamed away (atomic, only one worker succeeds)
+        before the new lock is created, and a lock is only removed by the worker holding it (token in lock content)
+    '''
+
+    def __init__(self, path, stale_after=600.):
+        self.path = path
+        self.stale_after = stale_after
+        self.token = uuid.uuid4().hex
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+
+    def _create(self):
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'host': socket.gethostname(), 'pid': os.getpid(), 'time': time.time(), 'token': self.token}, f)
+        return True
+
+
+    def is_stale(self, path=None):
+        try:
+            return time.time() - os.stat(path or self.path).st_mtime > self.stale_after
+        except FileNotFoundError:
+            return True
+
+
+    def read_owner(self):
+        ''' content of lock file (host, pid, time, token of holder), None if absent or not written yet '''
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+    def is_held(self):
+        owner = self.read_owner()
+        return owner is not None and owner.get('token') == self.token
+
+
+    def break_stale(self):
+        '''
+        take stale lock over: rename it to a name unique to this lock, s.t. of several workers finding the lock stale
+        only one moves it away; if the moved lock turns out to be live (stale lock broken and recreated by another
+        worker meanwhile) it is put back
+        '''
+        broken_path = '{}.broken.{}'.format(self.path, self.token)
+        try:
+            os.rename(self.path, broken_path)
+        except FileNotFoundError:
+            return False
+        if not self.is_stale(broken_path):
+            try:
+                os.link(broken_path, self.path) # fails if another lock was created meanwhile
+            except FileExistsError:
+                pass
+            os.remove(broken_path)
+            return False
+        print('[UnitLock] breaking stale lock {}'.format(self.path))
+        os.remove(broken_path)
+        return True
+
+
+    def acquire(self):
+        ''' claim unit, return False if claimed by another live worker '''
+        if not self._create():
+            if not self.is_stale() or not self.break_stale() or not self._create():
+                return False
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=self._beat, daemon=True)
+        self._heartbeat.start()
+        return True
+
+
+    def _beat(self):
+        while not self._stop.wait(self.stale_after / 4.):
+            try:
+                os.utime(self.path)
+            except OSError:
+                return
+
+
+    def release(self):
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+        if not self.is_held(): # never acquired, or broken as stale and claimed by another worker
+            return
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class ConversionJob():
+    '''
+        resumable batch conversion: inputs are processed in units (list of input files -> one output file),
+        each unit output is written to a temporary file and renamed on success, s.t. outputs are either complete or absent
+        the journal directory holds one json record per completed unit with checksums (sha256) of inputs and output
+        on restart, units with a record whose inputs, output and parameters still match are skipped
+        any number of workers (processes or nodes sharing the file system) can run the same job concurrently,
+        each unit is claimed by a lock file in the journal directory
+        :param units: list of (unit id, list of input files, output file)
+        :param convert: function convert(input files, output file) writing the unit output (must be picklable for n_workers > 1)
+        :param params: json serializable conversion parameters, units done with other parameters are redone
+        :param verify: 'checksum' (default) or 'size' verification of outputs of completed units
+    '''
+
+    def __init__(self, units, convert, journal_dir, params=None, verify='checksum', stale_after=600.):
+        self.units = units
+        self.convert = convert
+        self.journal_dir = journal_dir
+        self.params = params or {}
+        self.verify = verify
+        self.stale_after = stale_after
+        os.makedirs(journal_dir, exist_ok=True)
+
+
+    def record_path(self, unit_id):
+        return os.path.join(self.journal_dir, unit_id.replace(os.sep, '__') + '.json')
+
+
+    def read_record(self, unit_id):
+        path = self.record_path(unit_id)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+
+    def is_done(self, unit):
+        ''' unit completed with current parameters and inputs, output present and intact '''
+        unit_id, inputs, output = unit
+        record = self.read_record(unit_id)
+        if record is None or record['params'] != self.params:
+            return False
+        if [inp['path'] for inp in record['inputs']] != [os.path.abspath(fname) for fname in inputs]:
+            return False
+        if record['output']['path'] != os.path.abspath(output) or not all(file_unchanged(inp) for inp in record['inputs']):
+            return False
+        return self.verify_output(record['output'])
+
+
+    def verify_output(self, record):
+        try:
+            if os.stat(record['path']).st_size != record['size']:
+                return False
+        except OSError:
+            return False
+        return self.verify != 'checksum' or file_checksum(record['path']) == record['sha256']
+
+
+    def run_unit(self, unit):
+        ''' process unit unless done or claimed by another worker, return status 'skipped', 'busy', 'done' or 'failed' '''
+        unit_id, inputs, output = unit
+        if self.is_done(unit):
+            return 'skipped'
+        lock = UnitLock(self.record_path(unit_id)[:-len('.json')] + '.lock', self.stale_after)
+        if not lock.acquire():
+            return 'busy'
+        with lock:
+            if self.is_done(unit): # completed by other worker meanwhile
+                return 'skipped'
+            input_records = [file_record(fname) for fname in inputs]
+            tmp_output = '{}.tmp.{}.{}'.format(output, socket.gethostname(), os.getpid()) # not matched by readers globbing *.h5
+            os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+            try:
+                self.convert(inputs, tmp_output)
+                os.replace(tmp_output, output)
+            except Exception as e:
+                print('\n[ConversionJob] unit {} failed: {}'.format(unit_id, repr(e)))
+                if os.path.exists(tmp_output):
+                    os.remove(tmp_output)
+                return 'failed'
+            record = {'unit': unit_id, 'params': self.params, 'inputs': input_records, 'output': file_record(output),
+                      'host': socket.gethostname(), 'pid': os.getpid(), 'finished': time.strftime('%Y-%m-%dT%H:%M:%S')}
+            write_json_atomic(record, self.record_path(unit_id))
+        return 'done'
+
+
+    def run(self, n_workers=1):
+        '''
+        process all units with n_workers local processes
+        :return: dict of status -> list of unit ids
+        '''
+        if n_workers > 1:
+            with multiprocessing.Pool(n_workers) as pool:
+                statuses = pool.map(self.run_unit, self.units, chunksize=1)
+        else:
+            statuses = [self.run_unit(unit) for unit in self.units]
+        summary = {status: [] for status in ('done', 'skipped', 'busy', 'failed')}
+        for unit, status in zip(self.units, statuses):
+            summary[status].append(unit[0])
+        print('[ConversionJob] {} units: {}'.format(len(self.units), ', '.join('{} {}'.format(len(ids), status) for status, ids in summary.items())))
+        return summary
@@ -1,20 +1,28 @@
-import h5py
 import os
 import numpy as np
 import glob
-import pandas as pd
 import operator
 
 import sarewt.util as ut
+import sarewt.file_pool as fp
+import sarewt.feature_index as fi
+import sarewt.constituents_encoding as coen
+import sarewt.ragged as ra
 
 class DataReader():
     '''
         reads events (dijet constituents & dijet features)
         from single files and directories
+        files are opened and closed again on each call, unless the reader is used as context manager
+        or a file_pool is passed: then handles are kept open for reuse until the reader (pool) is closed
+        with a feature_index, files and chunks that cannot pass the requested cuts are not read
     '''
 
-    def __init__(self, path):
+    def __init__(self, path, file_pool=None, feature_index=None):
         self.path = path
+        self.own_file_pool = file_pool is None
+        self.file_pool = fp.H5FilePool(keep_open=False) if file_pool is None else file_pool
+        self.feature_index = feature_index
         self.jet_constituents_key = 'jetConstituentsList'
         self.jet_features_key = 'eventFeatures'
         self.dijet_feature_names = 'eventFeatureNames'
@@ -34,18 +42,96 @@ class DataReader():
         return flist
 
 
+    def close(self):
+        ''' close all files held open by the reader's file pool '''
+        self.file_pool.close()
+        if self.own_file_pool:
+            self.file_pool.keep_open = False
+
+
+    def __enter__(self):
+        self.file_pool.keep_open = True # reuse handles until exit
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def load_feature_index(self):
+        ''' use feature index sidecar of directory self.path (if built) to skip files and chunks failing cuts '''
+        self.feature_index = fi.FeatureIndex.load(self.path)
+        return self.feature_index
+
+
+    def get_row_ranges(self, fname, **cuts):
+        ''' row ranges of file that may pass cuts according to feature index, None to read all rows '''
+        if not (cuts and self.feature_index):
+            return None
+        return self.feature_index.selected_row_ranges(fname, **cuts)
+
+
+    def read_rows(self, dset, row_ranges=None, dtype=None):
+        if row_ranges is None:
+            return np.asarray(dset, dtype=dtype)
+        if not row_ranges:
+            return np.empty((0, *dset.shape[1:]), dtype=dtype or dset.dtype)
+        return np.concatenate([np.asarray(dset[start:stop], dtype=dtype) for start, stop in row_ranges], axis=0)
+
+
+    def read_ragged_rows(self, f, key, row_ranges=None):
+        ''' read constituents as RaggedConstituents (padded datasets are converted) '''
+        if key + ra.OFFSETS_SUFFIX not in f:
+            return ra.RaggedConstituents.from_padded(self.read_constituents_rows(f, key, row_ranges))
+        offsets_dset, particles_dset = f[key + ra.OFFSETS_SUFFIX], f[key + ra.PARTICLES_SUFFIX]
+        n_jets = int(offsets_dset.attrs.get('n_jets', 2))
+        offsets = np.asarray(offsets_dset)
+        row_ranges = [(0, (len(offsets) - 1) // n_jets)] if row_ranges is None else row_ranges
+        parts = [ra.RaggedConstituents(np.empty((0, particles_dset.shape[-1]), dtype=particles_dset.dtype), [0], n_jets)]
+        for start, stop in row_ranges:
+            jet_offsets = offsets[start*n_jets:stop*n_jets+1]
+            parts.append(ra.RaggedConstituents(particles_dset[jet_offsets[0]:jet_offsets[-1]], jet_offsets - jet_offsets[0], n_jets))
+        return ra.RaggedConstituents.concatenate(parts)
+
+
+    def read_constituents_rows(self, f, key, row_ranges=None, dtype=None):
+        ''' read constituents dataset, decoding storage encoding (see constituents_encoding) or padding ragged constituents to dense array '''
+        if key not in f and key + ra.OFFSETS_SUFFIX in f:
+            return self.read_ragged_rows(f, key, row_ranges).to_padded(self.constituents_shape[1], dtype=dtype or 'float32')
+        dset = f[key]
+        if 'encoding' not in dset.attrs:
+            return self.read_rows(dset, row_ranges, dtype=dtype)
+        attrs = dict(dset.attrs)
+        particle_ranges = row_ranges
+        extras = {}
+        if coen.parse_encoding(attrs['encoding'])[1]: # trimmed: flat particles, event rows located by multiplicity
+            multiplicity = np.asarray(f[key + coen.MULTIPLICITY_SUFFIX])
+            if row_ranges is not None:
+                offsets = coen.get_event_offsets(multiplicity)
+                particle_ranges = [(int(offsets[start]), int(offsets[stop])) for start, stop in row_ranges]
+            extras[coen.MULTIPLICITY_SUFFIX] = self.read_rows(multiplicity, row_ranges)
+        if key + coen.FLOAT_FEATURES_SUFFIX in f:
+            extras[coen.FLOAT_FEATURES_SUFFIX] = self.read_rows(f[key + coen.FLOAT_FEATURES_SUFFIX], particle_ranges)
+        return coen.decode_constituents(self.read_rows(dset, particle_ranges), attrs, extras, dtype=dtype or 'float32')
+
+
     def read_data_from_file(self, key, path=None):
         path = path or self.path
-        with h5py.File(path,'r') as f:
-            return np.asarray(f.get(key))
+        with self.file_pool.open(path) as f:
+            dset = f.get(key)
+            if (dset is None and key + ra.OFFSETS_SUFFIX in f) or (dset is not None and 'encoding' in dset.attrs):
+                return self.read_constituents_rows(f, key)
+            return np.asarray(dset)
 
 
-    def read_constituents_and_dijet_features_from_file(self, path, dtype='float32'):
-        ''' returns file contents (constituents and features) as numpy arrays '''
-        with h5py.File(path,'r') as f:
-            features = np.asarray(f.get(self.jet_features_key), dtype=dtype)
-            constituents = np.asarray(f.get(self.jet_constituents_key), dtype=dtype)
-            return [constituents, features]
+    def read_constituents_and_dijet_features_from_file(self, path, dtype='float32', row_ranges=None):
+        ''' returns file contents (constituents and features) as numpy arrays, optionally only rows in row_ranges '''
+        if row_ranges is not None and not row_ranges: # nothing to read, skip opening file
+            return [np.empty((0, *self.constituents_shape), dtype=dtype), np.empty((0, *self.features_shape), dtype=dtype)]
+        with self.file_pool.open(path) as f:
+            features = self.read_rows(f[self.jet_features_key], row_ranges, dtype=dtype)
+            constituents = self.read_constituents_rows(f, self.jet_constituents_key, row_ranges, dtype=dtype)
+        return [constituents, features]
 
 
     def make_cuts(self, constituents, features, **cuts):
@@ -58,7 +144,7 @@ class DataReader():
         fname = fname or self.path
 
         try:
-            constituents, features = self.read_constituents_and_dijet_features_from_file(fname) # -> np.ndarray, np.ndarray
+            constituents, features = self.read_constituents_and_dijet_features_from_file(fname, row_ranges=self.get_row_ranges(fname, **cuts)) # -> np.ndarray, np.ndarray
             if cuts:
                 constituents, features = self.make_cuts(constituents, features, **cuts) # -> np.ndarray, np.ndarray
         except OSError as e:
@@ -85,28 +171,28 @@ class DataReader():
         return constituents, features
 
 
-    def get_slice_of_size_stop_index(constituents, features, parts_sz_mb):
+    def get_slice_of_size_stop_index(self, constituents, features, parts_sz_mb):
         single_event_sz = constituents[0].nbytes + features[0].nbytes
-        return int(round(parts_sz_mb / single_event_sz))
+        return max(1, int(parts_sz_mb * 1024**2 / single_event_sz))
 
 
     def generate_event_parts_by_size(self, flist, parts_sz_mb, **cuts):
-        ''' not tested! '''
 
         # keep data in numpy arrays for size control
-        cons_cnct = np.empty((0, *self.constituents_shape))
-        feat_cnct = np.empty((0, *self.features_shape))
+        cons_cnct = np.empty((0, *self.constituents_shape), dtype='float32')
+        feat_cnct = np.empty((0, *self.features_shape), dtype='float32')
         samples_in_part_n = None
 
         for i_file, fname in enumerate(flist):
             cons_cnct, feat_cnct = self.append_file_content(cons_cnct, feat_cnct, fname, **cuts)
             sz_mb_total = (cons_cnct.nbytes + feat_cnct.nbytes) / 1024**2
 
-            while (sz_mb_total >= parts_sz_mb): # if event sample size exceeding max size or min n, yield next chunk and reset
+            while (sz_mb_total >= parts_sz_mb): # if event sample size exceeding max size, yield next chunk and reset
                 if samples_in_part_n is None:
-                    samples_in_part_n = self.get_slice_of_size_indices(cons_cnct, feat_cnct, parts_sz_mb)
-                cons_part, feat_part = cons_cnct[-parts_n:], feat_cnct[-parts_n:] # take last parts_n samples
-                cons_cnct, feat_cnct = np.resize(cons_cnct, (cons_cnct.shape[0]-parts_n, *cons_cnct.shape[1:])), np.resize(feat_cnct, (feat_cnct.shape[0]-parts_n, *feat_cnct.shape[1:]))
+                    samples_in_part_n = self.get_slice_of_size_stop_index(cons_cnct, feat_cnct, parts_sz_mb)
+                cons_part, feat_part = cons_cnct[:samples_in_part_n], feat_cnct[:samples_in_part_n] # take first samples_in_part_n samples
+                cons_cnct, feat_cnct = cons_cnct[samples_in_part_n:], feat_cnct[samples_in_part_n:]
+                sz_mb_total = (cons_cnct.nbytes + feat_cnct.nbytes) / 1024**2
                 yield (cons_part, feat_part)
         # if data left, yield it
         if len(feat_cnct) > 0:
@@ -146,7 +232,7 @@ class DataReader():
         if parts_n is not None:
             gen = self.generate_event_parts_by_num(int(parts_n), flist, **cuts)
         else: 
-            gen = self.generate_event_parts_by_size(parts_sz_mb, flist, **cuts)
+            gen = self.generate_event_parts_by_size(flist, parts_sz_mb, **cuts)
 
         for chunk in gen: 
             yield chunk
@@ -179,10 +265,79 @@ class DataReader():
 
         particle_feature_names, dijet_feature_names = self.read_labels_from_dir(flist)
 
-        features = pd.DataFrame(features_concat, columns=dijet_feature_names) if features_to_df else features_concat
+        if features_to_df:
+            import pandas as pd # deferred, pandas import is slow
+            features = pd.DataFrame(features_concat, columns=dijet_feature_names)
+        else:
+            features = features_concat
         return [constituents_concat, particle_feature_names, features, dijet_feature_names]
 
 
+    def read_ragged_events_from_file(self, fname=None, **cuts): # -> RaggedConstituents, np.ndarray
+        ''' read jet constituents without zero padding (see ragged.RaggedConstituents) and dijet features '''
+        fname = fname or self.path
+        row_ranges = self.get_row_ranges(fname, **cuts)
+        if row_ranges is not None and not row_ranges:
+            return ra.RaggedConstituents(np.empty((0, self.constituents_shape[-1]), dtype='float32'), [0]), np.empty((0, *self.features_shape), dtype='float32')
+        with self.file_pool.open(fname) as f:
+            constituents = self.read_ragged_rows(f, self.jet_constituents_key, row_ranges)
+            features = self.read_rows(f[self.jet_features_key], row_ranges, dtype='float32')
+        if cuts:
+            constituents, features = self.make_cuts(constituents, features, **cuts)
+        return constituents, features
+
+
+    def read_ragged_events_from_dir(self, read_n=None, **cuts): # -> RaggedConstituents, list, np.ndarray, list
+        '''
+        read dijet events from files in directory with jet constituents as RaggedConstituents
+        :return: concatenated ragged jet constituents and jet feature array + corresponding particle feature names and event feature names
+        '''
+        print('[DataReader] read_ragged_events_from_dir(): reading {} events from {}'.format((read_n or 'all'), self.path))
+
+        constituents_concat = []
+        features_concat = []
+
+        flist = self.get_file_list()
+        n = 0
+
+        for i_file, fname in enumerate(flist):
+            constituents, features = self.read_ragged_events_from_file(fname, **cuts)
+            constituents_concat.append(constituents)
+            features_concat.append(features)
+            n += len(features)
+            if read_n is not None and (n >= read_n):
+                break
+
+        constituents_concat, features_concat = ra.RaggedConstituents.concatenate(constituents_concat)[:read_n], np.concatenate(features_concat, axis=0)[:read_n]
+        particle_feature_names, dijet_feature_names = self.read_labels_from_dir(flist)
+        return [constituents_concat, particle_feature_names, features_concat, dijet_feature_names]
+
+
+    def generate_ragged_event_parts_from_dir(self, parts_n, pad=False, **cuts):
+        '''
+        yields events in parts_n (number of events) chunks with ragged jet constituents,
+        padded to dense [parts_n x 2 x 100 x 3] arrays only if pad is True
+        '''
+        constituents_concat, features_concat = None, None
+
+        for fname in self.get_file_list():
+            constituents, features = self.read_ragged_events_from_file(fname, **cuts)
+            if constituents_concat is None:
+                constituents_concat, features_concat = constituents, features
+            else:
+                constituents_concat = ra.RaggedConstituents.concatenate([constituents_concat, constituents])
+                features_concat = np.concatenate([features_concat, features], axis=0)
+
+            while (len(features_concat) >= parts_n):
+                constituents_part, constituents_concat = constituents_concat[:parts_n], constituents_concat[parts_n:]
+                features_part, features_concat = features_concat[:parts_n], features_concat[parts_n:]
+                yield (constituents_part.to_padded(self.constituents_shape[1]) if pad else constituents_part, features_part)
+
+        # if data left, yield it
+        if features_concat is not None and len(features_concat) > 0:
+            yield (constituents_concat.to_padded(self.constituents_shape[1]) if pad else constituents_concat, features_concat)
+
+
     def read_constituents_from_file(self):
         ''' return array of shape [N x 2 x 100 x 3] with
             N examples, each with 2 jets, each with 100 highest pt particles, each with features eta phi pt
@@ -203,11 +358,16 @@ class DataReader():
 
     def read_jet_features_from_file(self, path=None, features_to_df=False, **cuts):
         path = path or self.path
-        features = self.read_data_from_file(key=self.jet_features_key, path=path)
-        if cuts:
-            features = features[ut.get_mask_for_cuts(features, **cuts)]
-        if features_to_df:
-            features = pd.DataFrame(features, columns=self.read_labels_from_file(path, self.dijet_feature_names))
+        row_ranges = self.get_row_ranges(path, **cuts)
+        if row_ranges is not None and not row_ranges and not features_to_df: # no rows can pass cuts, skip opening file
+            return np.empty((0, *self.features_shape), dtype='float32')
+        with self.file_pool.open(path) as f: # features and labels read with one handle
+            features = self.read_rows(f[self.jet_features_key], row_ranges)
+            if cuts:
+                features = features[ut.get_mask_for_cuts(features, **cuts)]
+            if features_to_df:
+                import pandas as pd
+                features = pd.DataFrame(features, columns=self.read_labels(self.dijet_feature_names, path))
         return features
 
 
@@ -236,6 +396,7 @@ class DataReader():
         dijet_feature_names, = self.read_labels_from_dir(flist=flist, keylist=[self.dijet_feature_names])
 
         if features_to_df:
+            import pandas as pd
             features_concat = pd.DataFrame(features_concat, columns=dijet_feature_names)
 
         return [features_concat, dijet_feature_names]
@@ -252,8 +413,9 @@ class DataReader():
         if keylist is None:
             keylist = [self.constituents_feature_names, self.dijet_feature_names]
         labels = []
-        for key in keylist:
-            labels.append(self.read_labels(key, fname))
+        with self.file_pool.open(fname): # all keys read with one handle
+            for key in keylist:
+                labels.append(self.read_labels(key, fname))
         return labels
 
     def read_labels_from_dir(self, flist=None, keylist=None):
@@ -292,6 +454,27 @@ class DataReader():
 
         return files_n, features_n
 
+    def estimate_events_in_dir(self, **cuts):
+        '''
+        estimate number of events passing cuts in directory from feature index, without reading data
+        :return: estimated number of events, list of files not covered by index
+        '''
+        feature_index = self.feature_index or fi.FeatureIndex.load(self.path)
+        flist = self.get_file_list()
+        if feature_index is None:
+            return 0., flist
+
+        estimate_n = 0.
+        unindexed = []
+        for fname in flist:
+            n = feature_index.estimate_passing_n(fname, **cuts)
+            if n is None:
+                unindexed.append(fname)
+            else:
+                estimate_n += n
+
+        return estimate_n, unindexed
+
     # def __del__(self):
     #   print('[DataReader] deleting...')
 
@@ -300,8 +483,8 @@ class DataReader():
 class CaseDataReader(DataReader):
 
     # set different keys
-    def __init__(self, path):
-        DataReader.__init__(self, path)
+    def __init__(self, path, file_pool=None, feature_index=None):
+        DataReader.__init__(self, path, file_pool, feature_index)
         self.jet_features_key = 'jet_kinematics'
         self.dijet_feature_names_val = ['mJJ', 'DeltaEtaJJ', 'j1Pt', 'j1Eta', 'j1Phi', 'j1M', 'j2Pt', 'j2Eta', 'j2Phi', 'j2M', 'j3Pt', 'j3Eta', 'j3Phi', 'j3M']
         self.jet1_constituents_key = 'jet1_PFCands'
@@ -311,22 +494,30 @@ class CaseDataReader(DataReader):
 
     # TODO: how to exclude "test" file? (own get_file_list function?)
 
-    def read_jet_constituents_from_file(self, file):
+    def read_jet_constituents_from_file(self, file, row_ranges=None):
         ''' return jet constituents as array of shape N x 2 x 100 x 4
             (N examples, each with 2 jets, each jet with 100 highest-pt particles, each particle with px, py, pz, E features)
         '''
         if isinstance(file, str):
-            file = h5py.File(file,'r') 
-        j1_constituents = np.array(file.get(self.jet1_constituents_key)) # (576902, 100, 4)
-        j2_constituents = np.array(file.get(self.jet2_constituents_key)) # (576902, 100, 4)
+            with self.file_pool.open(file) as f:
+                return self.read_jet_constituents_from_file(f, row_ranges)
+        j1_constituents = self.read_rows(file.get(self.jet1_constituents_key), row_ranges) # (576902, 100, 4)
+        j2_constituents = self.read_rows(file.get(self.jet2_constituents_key), row_ranges) # (576902, 100, 4)
         return np.stack([j1_constituents, j2_constituents], axis=1)
 
 
-    def read_constituents_and_dijet_features_from_file(self, path):
-        with h5py.File(path,'r') as f:
-            features = np.array(f.get(self.jet_features_key))
-            constituents = self.read_jet_constituents_from_file(f)
-            return [constituents, features]
+    def read_constituents_and_dijet_features_from_file(self, path, row_ranges=None):
+        with self.file_pool.open(path) as f:
+            features = self.read_rows(f.get(self.jet_features_key), row_ranges)
+            constituents = self.read_jet_constituents_from_file(f, row_ranges)
+        return [constituents, features]
+
+    def read_labeled_events_from_file(self, path):
+        ''' returns jet constituents, jet features and truth labels of file '''
+        with self.file_pool.open(path):
+            constituents, features = self.read_constituents_and_dijet_features_from_file(path)
+            truth_labels = self.read_data_from_file(self.truth_label_key, path)
+        return [constituents, features, truth_labels]
 
     def read_labels(self, key, path=None):
         ''' labels are not provided in CASE dataset '''
@@ -352,8 +543,7 @@ class CaseDataReader(DataReader):
 
         for i_file, fname in enumerate(flist):
             try:
-                constituents, features = self.read_constituents_and_dijet_features_from_file(fname)
-                truth_labels = self.read_data_from_file(self.truth_label_key, fname)
+                constituents, features, truth_labels = self.read_labeled_events_from_file(fname)
                 constituents_concat.extend(constituents)
                 features_concat.extend(features)
                 truth_labels_concat.extend(truth_labels)
@@ -1,6 +1,84 @@
 import h5py
+import numpy as np
 
-def write_data_to_file( datasets, dataset_names, file_path ):
+import sarewt.constituents_encoding as coen
+import sarewt.ragged as ra
+
+def get_row_chunks(shape, itemsize, chunk_bytes=1024**2):
+    ''' chunk shape of whole rows (events) of about chunk_bytes size '''
+    row_bytes = max(1, int(np.prod(shape[1:], dtype=int)) * itemsize)
+    return (max(1, chunk_bytes // row_bytes), *shape[1:])
+
+
+def get_fixed_row_chunks(shape, itemsize):
+    ''' row chunks not exceeding the (fixed) number of rows '''
+    if not shape[0]:
+        return True
+    chunks = get_row_chunks(shape, itemsize)
+    return (min(chunks[0], shape[0]), *chunks[1:])
+
+
+def write_encoded_constituents( f, constituents, dat_name, encoding ):
+    ''' write constituents with storage encoding (see constituents_encoding) '''
+    data, attrs, extras = coen.encode_constituents(constituents, encoding)
+    dset = f.create_dataset(dat_name, data=data, compression='gzip', chunks=get_fixed_row_chunks(data.shape, data.dtype.itemsize))
+    dset.attrs.update(attrs)
+    for suffix, extra in extras.items():
+        f.create_dataset(dat_name + suffix, data=extra, compression='gzip', chunks=get_fixed_row_chunks(extra.shape, extra.dtype.itemsize))
+
+
+def write_ragged_constituents( f, ragged, dat_name ):
+    ''' write ragged constituents as flat particle and per-jet offset datasets '''
+    for suffix, data in ((ra.PARTICLES_SUFFIX, ragged.particles), (ra.OFFSETS_SUFFIX, ragged.offsets)):
+        f.create_dataset(dat_name + suffix, data=data, compression='gzip', chunks=get_fixed_row_chunks(data.shape, data.dtype.itemsize))
+    f[dat_name + ra.OFFSETS_SUFFIX].attrs['n_jets'] = ragged.n_jets
+
+
+def write_data_to_file( datasets, dataset_names, file_path, resizable=False, encodings=None ):
+    '''
+    write datasets to new file, resizable datasets can be extended along the event axis by append_data_to_file
+    ragged constituents are written as <name>Particles and <name>Offsets datasets
+    :param encodings: dict of dataset name -> constituents encoding spec (e.g. {'jetConstituentsList': 'fixed+trim'})
+    '''
+    encodings = {(k.decode('utf-8') if isinstance(k, bytes) else k): v for k, v in (encodings or {}).items()}
+    if resizable and encodings:
+        raise ValueError('encoded datasets can not be written resizable')
     with h5py.File(file_path, 'w') as f:
         for dat, dat_name in zip(datasets,dataset_names):
-            f.create_dataset(dat_name, data=dat, compression='gzip')
+            dat_name = dat_name.decode('utf-8') if isinstance(dat_name, bytes) else dat_name
+            if isinstance(dat, ra.RaggedConstituents):
+                write_ragged_constituents(f, dat, dat_name)
+            elif dat_name in encodings:
+                write_encoded_constituents(f, dat, dat_name, encodings[dat_name])
+            elif resizable:
+                dat = np.asarray(dat)
+                f.create_dataset(dat_name, data=dat, compression='gzip', maxshape=(None, *dat.shape[1:]), chunks=get_row_chunks(dat.shape, dat.dtype.itemsize))
+            else:
+                f.create_dataset(dat_name, data=dat, compression='gzip')
+
+
+def append_data_to_file( datasets, dataset_names, file_path ):
+    ''' append datasets along the event axis to resizable datasets of existing file '''
+    with h5py.File(file_path, 'a') as f:
+        for dat, dat_name in zip(datasets,dataset_names):
+            dset = f[dat_name]
+            n = dset.shape[0]
+            dset.resize(n + len(dat), axis=0)
+            dset[n:] = dat
+
+
+def truncate_data_in_file( dataset_names, file_path, n ):
+    ''' shrink resizable datasets of existing file to their first n events, return number of dropped events '''
+    dropped = 0
+    with h5py.File(file_path, 'a') as f:
+        for dat_name in dataset_names:
+            dset = f[dat_name]
+            if dset.shape[0] > n:
+                dropped = max(dropped, dset.shape[0] - n)
+                dset.resize(n, axis=0)
+    return dropped
+
+
+def is_resizable( dataset_names, file_path ):
+    with h5py.File(file_path, 'r') as f:
+        return all(f[dat_name].maxshape[0] is None for dat_name in dataset_names)
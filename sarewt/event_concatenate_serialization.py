@@ -1,8 +1,13 @@
+import os
+import sys
+import json
 import argparse
+import functools
 import numpy as np
 
-import data_reader as dr
-import data_writer as dw
+import sarewt.data_reader as dr
+import sarewt.data_writer as dw
+import sarewt.conversion_job as cojo
 
 def compute_num_file_parts(constituents, features, mb_sz):
     mb_sz_total = (constituents.nbytes + features.nbytes) / 1024**2
@@ -26,35 +31,197 @@ def write_file_parts(constituents, constituent_names, features, feature_names, k
         write_single_file([constituents_i, constituent_names, features_i, feature_names], keys, file_name, i)        
 
 
-def write_single_file_part(data, keys, file_name, part_n):
+def write_single_file_part(data, keys, file_name, part_n, encoding=None):
     ext_idx = file_name.rindex('.')
     file_name_part = file_name[:ext_idx] + "_{:03d}".format(part_n) + file_name[ext_idx:] 
-    write_file(data, keys, file_name_part)        
+    write_file(data, keys, file_name_part, encoding)        
 
 
-def write_file(data, keys, file_name):
+def write_file(data, keys, file_name, encoding=None):
+    ''' write concatenated data, jet constituents (first dataset) optionally with storage encoding (see constituents_encoding) '''
     print('writing {} events to {}'.format(data[0].shape[0], file_name))
-    dw.write_data_to_file(data, keys, file_name)
+    dw.write_data_to_file(data, keys, file_name, encodings={keys[0]: encoding} if encoding else None)
 
 
-def read_concat_write(indir, file_name, max_n, mb_sz, side, sigreg):    
-    reader = dr.DataReader(indir)
+def check_mode_arguments(parser, args):
+    ''' reject options without effect in --append, --job or file parts (-mb) mode, and job options (-fpu, -j) without --job '''
+    mode = '--append' if args.append else '--job' if args.job else '-mb' if args.mb_sz else None
+    if mode and args.num_evts is not None:
+        parser.error('-n is not supported with {}'.format(mode))
+    if args.append and args.encoding and not args.mb_sz:
+        parser.error('-enc with --append requires -mb (encoded datasets can not be appended to)')
+    if args.append and args.job:
+        parser.error('--append and --job are exclusive')
+    if args.job and args.mb_sz:
+        parser.error('-mb is not supported with --job (file parts are units of -fpu input files)')
+    if not args.job and (args.files_per_unit is not None or args.n_workers is not None):
+        parser.error('-fpu and -j require --job')
+
+
+def get_cuts(side, sigreg):
     cuts = {'mJJ': 1100.}
     if side:
         cuts['sideband'] = 1.4
     if sigreg:
         cuts['signalregion'] = 1.4
+    return cuts
+
+
+def read_concat_write(indir, file_name, max_n, mb_sz, side, sigreg, encoding=None):    
+    reader = dr.DataReader(indir)
+    cuts = get_cuts(side, sigreg)
     
     keys = [l.encode('utf-8') for l in ['jetConstituentsList', 'particleFeatureNames', 'eventFeatures', 'eventFeatureNames']]
     particle_feature_names, dijet_feature_names = encode_uf8(reader.read_labels_from_dir())
     # write multiple file parts
     if mb_sz:
-        for part_n, (constituents_concat, features_concat) in enumerate(reader.generate_event_parts_from_dir(min_sz_mb=mb_sz, **cuts)):
-            write_single_file_part([constituents_concat, particle_feature_names, features_concat, dijet_feature_names], keys=keys, file_name=file_name, part_n=part_n)
+        for part_n, (constituents_concat, features_concat) in enumerate(reader.generate_event_parts_from_dir(parts_sz_mb=mb_sz, **cuts)):
+            write_single_file_part([constituents_concat, particle_feature_names, features_concat, dijet_feature_names], keys=keys, file_name=file_name, part_n=part_n, encoding=encoding)
     # write single concat file
     else: 
-        constituents_concat, _, features_concat, _ = reader.read_events_from_dir(max_n=max_n, **cuts)
-        write_file([constituents_concat, particle_feature_names, features_concat, dijet_feature_names], keys=keys, file_name=file_name)
+        constituents_concat, _, features_concat, _ = reader.read_events_from_dir(read_n=int(max_n), **cuts)
+        write_file([constituents_concat, particle_feature_names, features_concat, dijet_feature_names], keys=keys, file_name=file_name, encoding=encoding)
+
+
+def manifest_path(file_name):
+    return file_name + '.inputs.json'
+
+
+def file_signature(fname):
+    stat = os.stat(fname)
+    return {'path': os.path.abspath(fname), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def read_manifest(file_name):
+    path = manifest_path(file_name)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(manifest, file_name):
+    ''' write manifest atomically (temporary file + rename) '''
+    path = manifest_path(file_name)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+def get_new_input_files(manifest, flist):
+    ''' return input files not yet concatenated into output described by manifest
+        raises ValueError if a concatenated input file changed (size or mtime) since
+    '''
+    done = {inp['path']: inp for inp in manifest['inputs']}
+    new_flist = []
+    for fname in flist:
+        sig = file_signature(fname)
+        if sig['path'] not in done:
+            new_flist.append(fname)
+        elif (done[sig['path']]['size'], done[sig['path']]['mtime']) != (sig['size'], sig['mtime']):
+            raise ValueError('input file {} changed since it was concatenated, full rebuild needed'.format(fname))
+    removed = set(done) - set(os.path.abspath(fname) for fname in flist)
+    if removed:
+        print('[WARNING] {} concatenated input files no longer in input directory (their events stay in output)'.format(len(removed)))
+    return new_flist
+
+
+def check_feature_names(reader, manifest, flist):
+    ''' check feature names of all new input files against each other and against existing output '''
+    names = reader.read_labels_from_dir(flist)
+    for fname in flist:
+        if reader.read_labels_from_file(fname) != names:
+            raise ValueError('feature names in {} inconsistent with other input files'.format(fname))
+    if manifest['feature_names'] is not None and manifest['feature_names'] != names:
+        raise ValueError('feature names of new input files inconsistent with existing output: {} vs {}'.format(names, manifest['feature_names']))
+    return names
+
+
+def read_concat_append(indir, file_name, mb_sz, side, sigreg, encoding=None):
+    '''
+    incremental concatenation: append only events of input files not yet recorded in the manifest of the output
+    (path, size and mtime of concatenated input files are stored in <file_name>.inputs.json)
+    without mb_sz events are appended to resizable datasets of a single output file, with mb_sz new file parts are written
+    (constituents encoding only supported for file parts, encoded datasets are not resizable)
+    the manifest records the number of output events, events appended by an interrupted run after the last manifest
+    update are dropped before appending (s.t. no input file is appended twice)
+    '''
+    if encoding and not mb_sz:
+        raise ValueError('constituents encoding {} can not be appended to single output file, use file parts (mb_sz)'.format(encoding))
+    reader = dr.DataReader(indir)
+    cuts = get_cuts(side, sigreg)
+    keys = ['jetConstituentsList', 'particleFeatureNames', 'eventFeatures', 'eventFeatureNames']
+
+    manifest = read_manifest(file_name)
+    if manifest is None:
+        manifest = {'cuts': cuts, 'mb_sz': mb_sz, 'feature_names': None, 'inputs': [], 'parts_n': 0, 'n_events': 0}
+    elif manifest['cuts'] != cuts or manifest['mb_sz'] != mb_sz:
+        raise ValueError('cuts {} / part size {} differ from existing output ({} / {}), full rebuild needed'.format(cuts, mb_sz, manifest['cuts'], manifest['mb_sz']))
+
+    flist = reader.get_file_list()
+    new_flist = get_new_input_files(manifest, flist)
+    print('appending events of {} new of {} input files to {}'.format(len(new_flist), len(flist), file_name))
+    if not new_flist:
+        return manifest
+
+    manifest['feature_names'] = check_feature_names(reader, manifest, new_flist)
+    particle_feature_names, dijet_feature_names = encode_uf8(manifest['feature_names'])
+
+    # write new file parts
+    if mb_sz:
+        for constituents_concat, features_concat in reader.generate_event_parts_by_size(new_flist, mb_sz, **cuts):
+            write_single_file_part([constituents_concat, particle_feature_names, features_concat, dijet_feature_names], keys=keys, file_name=file_name, part_n=manifest['parts_n'], encoding=encoding)
+            manifest['parts_n'] += 1
+            manifest['n_events'] += len(features_concat)
+        manifest['inputs'].extend(file_signature(fname) for fname in new_flist)
+        write_manifest(manifest, file_name)
+    # append to resizable datasets of single concat file
+    else:
+        if manifest['parts_n']: # roll back events of interrupted run not recorded in manifest
+            dropped = dw.truncate_data_in_file(['jetConstituentsList', 'eventFeatures'], file_name, manifest['n_events'])
+            if dropped:
+                print('[WARNING] dropped {} events appended to {} after last manifest update'.format(dropped, file_name))
+        for fname in new_flist:
+            constituents, features = reader.read_events_from_file(fname, **cuts)
+            if manifest['parts_n'] == 0:
+                print('writing {} events to {}'.format(len(features), file_name))
+                dw.write_data_to_file([constituents, particle_feature_names, features, dijet_feature_names], keys, file_name, resizable=True)
+                manifest['parts_n'] = 1
+            else:
+                print('appending {} events to {}'.format(len(features), file_name))
+                dw.append_data_to_file([constituents, features], ['jetConstituentsList', 'eventFeatures'], file_name)
+            manifest['n_events'] += len(features)
+            manifest['inputs'].append(dict(file_signature(fname), n_events=len(features)))
+            write_manifest(manifest, file_name)
+
+    return manifest
+
+
+def concat_unit(in_files, out_file, cuts, encoding=None):
+    ''' concatenate events passing cuts of in_files into out_file (unit of resumable job, read errors fail the unit) '''
+    keys = ['jetConstituentsList', 'particleFeatureNames', 'eventFeatures', 'eventFeatureNames']
+    constituents, features = [], []
+    with dr.DataReader(in_files[0]) as reader:
+        particle_feature_names, dijet_feature_names = encode_uf8(reader.read_labels_from_file(in_files[0]))
+        for fname in in_files:
+            cc, ff = reader.make_cuts(*reader.read_constituents_and_dijet_features_from_file(fname), **cuts)
+            constituents.append(cc)
+            features.append(ff)
+    write_file([np.concatenate(constituents), particle_feature_names, np.concatenate(features), dijet_feature_names], keys, out_file, encoding)
+
+
+def read_concat_write_job(indir, file_name, files_per_unit, side, sigreg, encoding=None, n_workers=1, verify='checksum'):
+    '''
+    resumable concatenation: each unit of files_per_unit input files is concatenated into file part <file_name>_<unit>.h5
+    progress is journaled in <file_name>.job/, on restart completed units are verified and skipped
+    the same job can be run by several workers/nodes concurrently
+    '''
+    cuts = get_cuts(side, sigreg)
+    flist = dr.DataReader(indir).get_file_list()
+    units = cojo.units_by_group(flist, file_name, files_per_unit)
+    convert = functools.partial(concat_unit, cuts=cuts, encoding=encoding)
+    job = cojo.ConversionJob(units, convert, file_name + '.job', params={'cuts': cuts, 'encoding': encoding}, verify=verify)
+    return job.run(n_workers)
 
 
 if __name__ == "__main__":
@@ -62,13 +229,26 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='read, concatenate and write events from all files in directory')
     parser.add_argument('-in', dest='indir', type=str, help='input directory')
     parser.add_argument('-out', dest='outfile', type=str, default='out.h5', help='output file name/path')
-    parser.add_argument('-n', dest='num_evts', type=int, default=1e9, help='max number of events for output dataset')
+    parser.add_argument('-n', dest='num_evts', type=int, help='max number of events for output dataset (default: all)')
     parser.add_argument('-mb', dest='mb_sz', type=int, help='split concatenated dataset in multiple files, each of size mb [MB]')
     parser.add_argument('--side', dest='side', action='store_true', help='|dEta| > 1.4 sideband')
     parser.add_argument('--signal', dest='sigreg', action='store_true', help='|dEta| <= 1.4  signalregion')
+    parser.add_argument('-enc', dest='encoding', type=str, help='jet constituents storage encoding: float16, fixed, trim or combined e.g. fixed+trim')
+    parser.add_argument('--append', dest='append', action='store_true', help='only append events of input files not yet concatenated into output')
+    parser.add_argument('--job', dest='job', action='store_true', help='resumable job: concatenate units of -fpu input files into file parts, skipping units completed before')
+    parser.add_argument('-fpu', dest='files_per_unit', type=int, help='number of input files per unit of resumable job (default: 10)')
+    parser.add_argument('-j', dest='n_workers', type=int, help='number of parallel workers of resumable job (default: 1)')
 
     args = parser.parse_args()
+    check_mode_arguments(parser, args)
 
     print('concatenating data in', args.indir)
 
-    read_concat_write(args.indir, args.outfile, args.num_evts, args.mb_sz, args.side, args.sigreg)
\ No newline at end of file
+    if args.job:
+        summary = read_concat_write_job(args.indir, args.outfile, args.files_per_unit or 10, args.side, args.sigreg, args.encoding, args.n_workers or 1)
+        if summary['failed']:
+            sys.exit(1)
+    elif args.append:
+        read_concat_append(args.indir, args.outfile, args.mb_sz, args.side, args.sigreg, args.encoding)
+    else:
+        read_concat_write(args.indir, args.outfile, args.num_evts or int(1e9), args.mb_sz, args.side, args.sigreg, args.encoding)
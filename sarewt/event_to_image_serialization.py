@@ -1,9 +1,13 @@
+import os
+import sys
 import argparse
+import functools
 import numpy as np
 import h5py
 
-import data_reader as dr
-import util as ut
+import sarewt.data_reader as dr
+import sarewt.util as ut
+import sarewt.conversion_job as cojo
 
 class ImageSerializer():
 
@@ -12,10 +16,9 @@ class ImageSerializer():
         self.n_bins = n_bins
 
     def read_file(self, path ):
-        event_reader = dr.DataReader( path )
-        events = event_reader.read_jet_constituents()
-        dijet_features = event_reader.read_jet_features()
-        labels = event_reader.read_labels()
+        with dr.DataReader( path ) as event_reader:
+            events, dijet_features = event_reader.read_events_from_file()
+            labels = event_reader.read_labels()
         return [events[:, 0, :, :], events[:, 1, :, :], dijet_features, labels]
 
 
@@ -34,6 +37,27 @@ class ImageSerializer():
         return images
 
 
+    def bin_ragged_data_to_image( self, particles, event_idx, n_events, bin_borders ):
+        ''' bin particles of ragged jets (particles [P x 3] with event index of each particle) to pt-weighted eta-phi images '''
+
+        images = np.zeros((n_events, self.n_bins, self.n_bins), dtype="float32")
+        binIdxEta = np.digitize(particles[:, 0], bin_borders, right=True) - 1  # np.digitize starts binning with 1
+        binIdxPhi = np.digitize(particles[:, 1], bin_borders, right=True) - 1
+        np.add.at(images, (event_idx, binIdxEta, binIdxPhi), particles[:, 2])  # add pt to bin of jet image
+
+        return images
+
+
+    def convert_ragged_events_to_image( self, constituents ):
+        ''' convert ragged.RaggedConstituents of dijet events to jet images of both jets (without padding) '''
+
+        minAngle = -0.8;
+        maxAngle = 0.8
+        bin_borders = np.linspace(minAngle, maxAngle, num=self.n_bins)  # bins for eta & phi
+
+        return [ self.bin_ragged_data_to_image( *constituents.jet(i_jet), len(constituents), bin_borders ) for i_jet in range(2) ]
+
+
     def convert_events_to_image( self, events_j1, events_j2 ):
 
         minAngle = -0.8;
@@ -90,6 +114,23 @@ class ImageSerializer():
         self.write_transformed( image_data, dijet_features, labels, out_path )
 
 
+def images_unit(in_files, out_file, n_bins, n_evts):
+    ''' convert single input file to jet images (unit of resumable job) '''
+    ImageSerializer(n_bins).read_events_write_images(in_files[0], out_file, n_evts)
+
+
+def convert_dir_to_images_job(in_dir, out_dir, n_bins, n_evts, n_workers=1, verify='checksum'):
+    '''
+    resumable conversion of all files in in_dir to jet images in out_dir (mirroring directory structure), one unit per file
+    progress is journaled in out_dir/.sarewt_job/, on restart completed units are verified and skipped
+    the same job can be run by several workers/nodes concurrently
+    '''
+    units = cojo.units_by_file(in_dir, out_dir, dr.DataReader(in_dir).get_file_list())
+    convert = functools.partial(images_unit, n_bins=n_bins, n_evts=n_evts)
+    job = cojo.ConversionJob(units, convert, os.path.join(out_dir, '.sarewt_job'), params={'n_bins': n_bins, 'n_evts': n_evts}, verify=verify)
+    return job.run(n_workers)
+
+
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description='transform event data to jet image')
@@ -97,8 +138,17 @@ if __name__ == "__main__":
     parser.add_argument('-out', dest='outfile', type=str, default='out.h5', help='output file name/path')
     parser.add_argument('-bin', dest='n_bins', type=int, default=32, help='number of bins in jet image')
     parser.add_argument('-n', dest='num_evts', type=int, default=1e9, help='number of events for output dataset')
+    parser.add_argument('--job', dest='job', action='store_true', help='resumable job: convert each file of input directory -in to output directory -out, skipping files converted before')
+    parser.add_argument('-j', dest='n_workers', type=int, help='number of parallel workers of resumable job (default: 1)')
 
     args = parser.parse_args()
+    if args.n_workers is not None and not args.job:
+        parser.error('-j requires --job')
+
+    if args.job:
+        print('converting data in directory', args.infile)
+        summary = convert_dir_to_images_job(args.infile, args.outfile, args.n_bins, int(args.num_evts), args.n_workers or 1)
+        sys.exit(1 if summary['failed'] else 0)
 
     print('converting data in file', args.infile)
 
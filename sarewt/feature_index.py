@@ -0,0 +1,202 @@
+import os
+import json
+import numpy as np
+
+import sarewt.util as ut
+import sarewt.constituents_encoding as coen
+
+
+def _abs_min(lo, hi):
+    ''' smallest |x| for x in [lo, hi] '''
+    return np.where((lo <= 0) & (hi >= 0), 0., np.minimum(np.abs(lo), np.abs(hi)))
+
+
+def may_pass_cuts(mins, maxs, **cuts):
+    '''
+    zone-map test: can any event with feature values within [mins, maxs] pass cuts (as applied by util.get_mask_for_cuts)?
+    :param mins, maxs: arrays of shape [... x n_features] of per-file or per-chunk feature minima and maxima
+    :return: boolean array of shape [...], False only where no event can pass
+    '''
+    mins, maxs = np.asarray(mins, dtype='float64'), np.asarray(maxs, dtype='float64')
+    idx = ut.FEAT_IDX
+    mask = np.ones(mins.shape[:-1], dtype=bool)
+
+    for key, value in cuts.items():
+
+        if key == 'sideband':
+            mask &= np.maximum(np.abs(mins[..., idx['DeltaEtaJJ']]), np.abs(maxs[..., idx['DeltaEtaJJ']])) > value
+        elif key == 'signalregion':
+            mask &= _abs_min(mins[..., idx['DeltaEtaJJ']], maxs[..., idx['DeltaEtaJJ']]) <= value
+        elif key == 'mJJ' or key == 'j1Pt' or key == 'j2Pt':
+            mask &= maxs[..., idx[key]] > value
+        elif key == 'jXPt':
+            mask &= (maxs[..., idx['j1Pt']] > value) | (maxs[..., idx['j2Pt']] > value)
+        elif key == 'j1Eta':
+            mask &= _abs_min(mins[..., idx[key]], maxs[..., idx[key]]) < value
+        elif key == 'j2Eta': # j2Eta = DeltaEtaJJ + j1Eta lies within the sum of both intervals
+            lo = mins[..., idx['DeltaEtaJJ']] + mins[..., idx['j1Eta']]
+            hi = maxs[..., idx['DeltaEtaJJ']] + maxs[..., idx['j1Eta']]
+            mask &= _abs_min(lo, hi) < value
+
+    return mask
+
+
+def _cdf(x, edges, counts):
+    ''' fraction of histogrammed events with value <= x (uniform within bins) '''
+    cum = np.concatenate([[0.], np.cumsum(counts, dtype='float64')])
+    return np.interp(x, edges, cum / max(cum[-1], 1.))
+
+
+def estimate_pass_fraction(edges, counts, **cuts):
+    ''' estimate fraction of events passing cuts from per-feature histograms (features assumed independent) '''
+    idx = ut.FEAT_IDX
+    above = lambda key, value: 1. - _cdf(value, edges[idx[key]], counts[idx[key]])
+    below = lambda key, value: _cdf(value, edges[idx[key]], counts[idx[key]])
+    fraction = 1.
+
+    for key, value in cuts.items():
+
+        if key == 'sideband':
+            fraction *= above('DeltaEtaJJ', value) + below('DeltaEtaJJ', -value)
+        elif key == 'signalregion':
+            fraction *= below('DeltaEtaJJ', value) - below('DeltaEtaJJ', -value)
+        elif key == 'mJJ' or key == 'j1Pt' or key == 'j2Pt':
+            fraction *= above(key, value)
+        elif key == 'jXPt':
+            p1, p2 = above('j1Pt', value), above('j2Pt', value)
+            fraction *= p1 + p2 - p1 * p2
+        elif key == 'j1Eta':
+            fraction *= below(key, value) - below(key, -value)
+        # j2Eta: no estimate from marginal histograms (upper bound kept)
+
+    return fraction
+
+
+def _nan_to_unbounded(mins, maxs):
+    ''' replace NaN minima and maxima (no finite value summarized) by -inf and inf, return as lists '''
+    return np.where(np.isnan(mins), -np.inf, mins).tolist(), np.where(np.isnan(maxs), np.inf, maxs).tolist()
+
+
+class FeatureIndex():
+    '''
+        per-file and per-chunk min/max and per-file histogram summaries of the dijet feature columns
+        stored in a sidecar json file in the sample directory and used to skip files or chunks of rows
+        that cannot pass cuts and to estimate passing event counts without reading the data
+        entries of files modified after indexing (size or mtime changed) are ignored
+    '''
+
+    file_name = '.sarewt_feature_index.json'
+
+    def __init__(self, base_dir, entries=None):
+        self.base_dir = base_dir
+        self.entries = entries or {}
+
+
+    @classmethod
+    def index_path(cls, base_dir):
+        return os.path.join(base_dir, cls.file_name)
+
+
+    @classmethod
+    def load(cls, base_dir):
+        ''' load index of directory base_dir, return None if no index was built '''
+        path = cls.index_path(base_dir)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return cls(base_dir, json.load(f))
+
+
+    def save(self):
+        path = self.index_path(self.base_dir)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(path + '.tmp', path)
+
+
+    @classmethod
+    def build(cls, reader, flist=None, n_bins=50, chunk_rows=None):
+        '''
+        summarize dijet features of all files read by reader
+        :param chunk_rows: number of rows per chunk summary (default: hdf5 chunk rows of jet constituents dataset)
+        '''
+        index = cls(reader.path)
+        flist = reader.get_file_list() if flist is None else flist
+        for fname in flist:
+            try:
+                index.add_file(reader, fname, n_bins=n_bins, chunk_rows=chunk_rows)
+            except (OSError, KeyError, IndexError) as e:
+                print("\nCould not index file ", fname, ': ', repr(e))
+        return index
+
+
+    def add_file(self, reader, fname, n_bins=50, chunk_rows=None):
+        with reader.file_pool.open(fname) as f:
+            features = np.asarray(f[reader.jet_features_key], dtype='float64')
+            if chunk_rows is None:
+                constituents = f.get(reader.jet_constituents_key)
+                trimmed = constituents is not None and 'encoding' in constituents.attrs and coen.parse_encoding(constituents.attrs['encoding'])[1]
+                # rows of trimmed constituents are particles, not events
+                chunks = (constituents.chunks if constituents is not None and not trimmed else None) or f[reader.jet_features_key].chunks
+                chunk_rows = chunks[0] if chunks else 1024
+        starts = np.arange(0, len(features), chunk_rows)
+        stat = os.stat(fname)
+        entry = {'size': stat.st_size, 'mtime': stat.st_mtime, 'n': len(features), 'chunk_rows': int(chunk_rows)}
+        if len(features):
+            # NaN values ignored (fmin/fmax), all-NaN columns summarized as unbounded s.t. pruning stays conservative
+            entry['min'], entry['max'] = _nan_to_unbounded(np.fmin.reduce(features, axis=0), np.fmax.reduce(features, axis=0))
+            entry['chunk_min'], entry['chunk_max'] = _nan_to_unbounded(np.fmin.reduceat(features, starts, axis=0), np.fmax.reduceat(features, starts, axis=0))
+            hists = [np.histogram(col[np.isfinite(col)], bins=n_bins) for col in features.T]
+            entry['hist_counts'] = [h[0].tolist() for h in hists]
+            entry['hist_edges'] = [h[1].tolist() for h in hists]
+        self.entries[os.path.relpath(fname, self.base_dir)] = entry
+
+
+    def get_entry(self, fname):
+        ''' return summary of file fname or None if not indexed or modified since '''
+        entry = self.entries.get(os.path.relpath(fname, self.base_dir))
+        if entry is None:
+            return None
+        stat = os.stat(fname)
+        if (stat.st_size, stat.st_mtime) != (entry['size'], entry['mtime']):
+            return None
+        return entry
+
+
+    def may_pass(self, fname, **cuts):
+        ''' False if no event of file fname can pass cuts '''
+        entry = self.get_entry(fname)
+        if entry is None:
+            return True
+        return entry['n'] > 0 and bool(may_pass_cuts(entry['min'], entry['max'], **cuts))
+
+
+    def selected_row_ranges(self, fname, **cuts):
+        '''
+        return list of (start, stop) row ranges of chunks that may contain events passing cuts
+        (adjacent chunks merged, empty if no event can pass) or None if file not indexed
+        '''
+        entry = self.get_entry(fname)
+        if entry is None:
+            return None
+        if entry['n'] == 0 or not may_pass_cuts(entry['min'], entry['max'], **cuts):
+            return []
+        chunk_mask = may_pass_cuts(entry['chunk_min'], entry['chunk_max'], **cuts)
+        ranges = []
+        for i_chunk in np.flatnonzero(chunk_mask):
+            start, stop = int(i_chunk) * entry['chunk_rows'], min((int(i_chunk) + 1) * entry['chunk_rows'], entry['n'])
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], stop)
+            else:
+                ranges.append((start, stop))
+        return ranges
+
+
+    def estimate_passing_n(self, fname, **cuts):
+        ''' estimate number of events of file fname passing cuts, None if file not indexed '''
+        entry = self.get_entry(fname)
+        if entry is None:
+            return None
+        if entry['n'] == 0 or not may_pass_cuts(entry['min'], entry['max'], **cuts):
+            return 0.
+        return entry['n'] * estimate_pass_fraction(entry['hist_edges'], entry['hist_counts'], **cuts)
@@ -0,0 +1,142 @@
+import os
+import threading
+import collections
+import contextlib
+
+
+class H5FilePool():
+    '''
+        LRU pool of open read-only h5py file handles
+        all reads of one file share a single handle, least recently used handles are closed when evicted
+        handles are only accessed with open(), which checks them out: handles in use are never evicted
+        :param max_open: maximal number of simultaneously open files (exceeded only while more handles are checked out)
+        :param rdcc_nbytes: size of raw data chunk cache per dataset in bytes (h5py default 1MB)
+        :param rdcc_nslots: number of chunk slots in the chunk cache hash table (should be prime, ~100 x number of cached chunks)
+        :param rdcc_w0: chunk preemption policy (0: evict least recently used, 1: evict fully read chunks first)
+        :param page_buf_size: page buffer size in bytes (only effective for files written with fs_strategy='page')
+        :param keep_open: keep handles open after use (False: close handle when last open() block of the file exits)
+    '''
+
+    def __init__(self, max_open=16, rdcc_nbytes=64*1024**2, rdcc_nslots=10007, rdcc_w0=0.75, page_buf_size=None, keep_open=True):
+        self.max_open = max_open
+        self.rdcc_nbytes = rdcc_nbytes
+        self.rdcc_nslots = rdcc_nslots
+        self.rdcc_w0 = rdcc_w0
+        self.page_buf_size = page_buf_size
+        self.keep_open = keep_open
+        self._handles = collections.OrderedDict()
+        self._in_use = collections.Counter()
+        self._lock = threading.RLock()
+
+
+    def _open(self, path):
+        import h5py # deferred to first file access (keeps import of readers fast)
+        kwargs = dict(rdcc_nbytes=self.rdcc_nbytes, rdcc_nslots=self.rdcc_nslots, rdcc_w0=self.rdcc_w0)
+        if self.page_buf_size:
+            kwargs['page_buf_size'] = self.page_buf_size
+        return h5py.File(path, 'r', **kwargs)
+
+
+    def _evict(self):
+        ''' close least recently used handles not checked out until at most max_open handles are open (most recent handle kept) '''
+        for key in list(self._handles)[:-1]:
+            if len(self._handles) <= self.max_open:
+                break
+            if not self._in_use[key]:
+                self._handles.pop(key).close()
+
+
+    def _get(self, path):
+        ''' return open handle to file at path, opening it (and evicting the least recently used handle) if needed
+            (handle is not checked out, callers hold the pool lock and check it out, see open())
+        '''
+        key = os.path.abspath(path)
+        with self._lock:
+            f = self._handles.get(key)
+            if f is not None and f.id.valid:
+                self._handles.move_to_end(key)
+                return f
+            f = self._open(path)
+            self._handles[key] = f
+            self._evict()
+            return f
+
+
+    @contextlib.contextmanager
+    def open(self, path):
+        ''' context manager yielding handle checked out for the duration of the block
+            (with keep_open the handle stays in the pool on exit, otherwise it is closed once no block holds it)
+        '''
+        key = os.path.abspath(path)
+        with self._lock:
+            self._in_use[key] += 1
+            try:
+                f = self._get(path)
+            except BaseException:
+                self._checkin(key)
+                raise
+        try:
+            yield f
+        finally:
+            with self._lock:
+                self._checkin(key)
+
+
+    def _checkin(self, key):
+        self._in_use[key] -= 1
+        if self._in_use[key] > 0:
+            return
+        del self._in_use[key]
+        if not self.keep_open:
+            f = self._handles.pop(key, None)
+            if f is not None:
+                f.close()
+        else:
+            self._evict()
+
+
+    def release(self, path):
+        ''' close and remove handle of file at path from pool '''
+        with self._lock:
+            f = self._handles.pop(os.path.abspath(path), None)
+            if f is not None:
+                f.close()
+
+
+    def close(self):
+        ''' close all pooled handles '''
+        with self._lock:
+            while self._handles:
+                _, f = self._handles.popitem()
+                f.close()
+
+
+    def __getstate__(self):
+        ''' pickled pool (e.g. of reader sent to worker process) holds configuration only, no open handles '''
+        state = self.__dict__.copy()
+        for key in ('_handles', '_in_use', '_lock'):
+            del state[key]
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._handles = collections.OrderedDict()
+        self._in_use = collections.Counter()
+        self._lock = threading.RLock()
+
+
+    def __contains__(self, path):
+        return os.path.abspath(path) in self._handles
+
+
+    def __len__(self):
+        return len(self._handles)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,112 @@
+import os
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as pads
+import pyarrow.parquet as pq
+
+
+def export_features_to_parquet(reader, out_dir, row_group_size=64*1024):
+    '''
+    export dijet features of all files read by reader (eventFeatures + eventFeatureNames, for CaseDataReader jet_kinematics + truth_label)
+    to parquet dataset in out_dir, partitioned into one parquet file per input file (mirroring directory structure)
+    parquet row group statistics allow skipping row groups that cannot pass cuts
+    :return: list of written parquet files
+    '''
+    truth_label_key = getattr(reader, 'truth_label_key', None)
+    written = []
+    for fname in reader.get_file_list():
+        try:
+            features = reader.read_jet_features_from_file(path=fname)
+            feature_names, = reader.read_labels_from_file(fname, [reader.dijet_feature_names])
+            columns = {name: features[:, i] for i, name in enumerate(feature_names)}
+            if truth_label_key is not None:
+                columns['truth_label'] = reader.read_data_from_file(truth_label_key, fname).reshape(len(features), -1)[:, 0]
+        except (OSError, KeyError, IndexError) as e:
+            print("\nCould not read file ", fname, ': ', repr(e))
+            continue
+        out_file = os.path.join(out_dir, os.path.splitext(os.path.relpath(fname, reader.path))[0] + '.parquet')
+        os.makedirs(os.path.dirname(out_file), exist_ok=True)
+        pq.write_table(pa.table(columns), out_file, row_group_size=row_group_size)
+        written.append(out_file)
+    print('exported features of {} files in {} to {}'.format(len(written), reader.path, out_dir))
+    return written
+
+
+def cuts_to_expression(**cuts):
+    '''
+    translate cuts (as applied by util.get_mask_for_cuts) to arrow filter expression on feature columns
+    (absolute value cuts written as ranges s.t. row group min/max statistics can be used)
+    '''
+    field = pads.field
+    expr = None
+
+    for key, value in cuts.items():
+
+        if key == 'sideband':
+            cut = (field('DeltaEtaJJ') > value) | (field('DeltaEtaJJ') < -value)
+        elif key == 'signalregion':
+            cut = (field('DeltaEtaJJ') <= value) & (field('DeltaEtaJJ') >= -value)
+        elif key == 'mJJ' or key == 'j1Pt' or key == 'j2Pt':
+            cut = field(key) > value
+        elif key == 'jXPt':
+            cut = (field('j1Pt') > value) | (field('j2Pt') > value)
+        elif key == 'j1Eta':
+            cut = (field('j1Eta') < value) & (field('j1Eta') > -value)
+        elif key == 'j2Eta':
+            j2_eta = field('DeltaEtaJJ') + field('j1Eta')
+            cut = (j2_eta < value) & (j2_eta > -value)
+        else:
+            continue
+
+        expr = cut if expr is None else expr & cut
+
+    return expr
+
+
+class ParquetFeatureReader():
+    '''
+        reads dijet features from parquet dataset written by export_features_to_parquet
+        with column projection and cuts pushed down to the parquet scan
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.dataset = pads.dataset(path, format='parquet')
+
+
+    @property
+    def feature_names(self):
+        return self.dataset.schema.names
+
+
+    def read_table(self, columns=None, read_n=None, **cuts):
+        ''' return arrow table of columns (default: all) of events passing cuts '''
+        if read_n is None:
+            return self.dataset.to_table(columns=columns, filter=cuts_to_expression(**cuts))
+        return self.dataset.head(int(read_n), columns=columns, filter=cuts_to_expression(**cuts))
+
+
+    def read_jet_features(self, columns=None, read_n=None, features_to_df=False, **cuts):
+        '''
+        reading dijet features with cuts, same return values as DataReader.read_jet_features_from_dir
+        :return: features as numpy array (or pandas DataFrame converted from arrow without extra copy) and feature names
+        '''
+        table = self.read_table(columns, read_n, **cuts)
+        print('[ParquetFeatureReader] read {} events from {}'.format(table.num_rows, self.path))
+        names = table.schema.names
+        if features_to_df:
+            return [table.to_pandas(split_blocks=True, self_destruct=True), names]
+        features = np.empty((table.num_rows, len(names)), dtype='float32')
+        for i, column in enumerate(table.columns):
+            features[:, i] = column.to_numpy()
+        return [features, names]
+
+
+    def read_column(self, name, **cuts):
+        ''' single feature column of events passing cuts as numpy array '''
+        return self.read_table([name], **cuts).column(0).to_numpy()
+
+
+    def histogram(self, name, bins=100, range=None, **cuts):
+        ''' histogram of single feature column of events passing cuts (np.histogram return values) '''
+        return np.histogram(self.read_column(name, **cuts), bins=bins, range=range)
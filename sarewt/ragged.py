@@ -0,0 +1,96 @@
+import numpy as np
+
+import sarewt.constituents_encoding as coen
+
+PARTICLES_SUFFIX = 'Particles'
+OFFSETS_SUFFIX = 'Offsets'
+
+
+class RaggedConstituents():
+    '''
+        jet constituents of N events with n_jets jets each, stored without zero padding as
+        flat particle array [P x n_features] and per-jet offsets [N*n_jets + 1]
+        (particles of jet j of event i: particles[offsets[i*n_jets+j]:offsets[i*n_jets+j+1]])
+        indexing with an int, slice, index array or boolean mask selects events (as for padded arrays)
+    '''
+
+    def __init__(self, particles, offsets, n_jets=2):
+        self.particles = np.asarray(particles)
+        self.offsets = np.asarray(offsets, dtype='int64')
+        self.n_jets = n_jets
+        if (len(self.offsets) - 1) % n_jets:
+            raise ValueError('number of jets {} not a multiple of {} jets per event'.format(len(self.offsets) - 1, n_jets))
+
+
+    @classmethod
+    def from_padded(cls, constituents):
+        ''' convert zero-padded constituents [N x n_jets x n_particles x n_features] (padding at end of particle axis) '''
+        constituents = np.asarray(constituents)
+        multiplicity = coen.get_multiplicity(constituents).ravel()
+        filled = np.arange(constituents.shape[-2]) < multiplicity[:, None]
+        particles = constituents.reshape(-1, *constituents.shape[-2:])[filled]
+        offsets = np.concatenate([[0], np.cumsum(multiplicity)])
+        return cls(particles, offsets, n_jets=constituents.shape[1])
+
+
+    @classmethod
+    def concatenate(cls, ragged_list):
+        ragged_list = list(ragged_list)
+        particles = np.concatenate([r.particles for r in ragged_list], axis=0)
+        starts = np.cumsum([0] + [r.offsets[-1] for r in ragged_list[:-1]])
+        offsets = np.concatenate([[0]] + [r.offsets[1:] + start for r, start in zip(ragged_list, starts)])
+        return cls(particles, offsets, n_jets=ragged_list[0].n_jets)
+
+
+    def __len__(self):
+        return (len(self.offsets) - 1) // self.n_jets
+
+
+    @property
+    def shape(self):
+        ''' shape of padded equivalent with maximal multiplicity '''
+        return (len(self), self.n_jets, int(self.multiplicity.max(initial=0)), self.particles.shape[-1])
+
+
+    @property
+    def nbytes(self):
+        return self.particles.nbytes + self.offsets.nbytes
+
+
+    @property
+    def multiplicity(self):
+        ''' number of particles per jet [N x n_jets] '''
+        return np.diff(self.offsets).reshape(-1, self.n_jets)
+
+
+    def __getitem__(self, idx):
+        events = np.arange(len(self))[idx]
+        if np.ndim(events) == 0:
+            events = np.asarray([events])
+        jets = (events[:, None] * self.n_jets + np.arange(self.n_jets)).ravel()
+        starts, counts = self.offsets[jets], np.diff(self.offsets)[jets]
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        particle_idx = np.repeat(starts - offsets[:-1], counts) + np.arange(offsets[-1])
+        return RaggedConstituents(self.particles[particle_idx], offsets, self.n_jets)
+
+
+    def jet(self, i_jet):
+        '''
+        particles of jet i_jet of all events
+        :return: particles [P_j x n_features], event index of each particle [P_j]
+        '''
+        counts = self.multiplicity[:, i_jet]
+        starts = self.offsets[:-1].reshape(-1, self.n_jets)[:, i_jet]
+        particle_idx = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        return self.particles[particle_idx], np.repeat(np.arange(len(self)), counts)
+
+
+    def to_padded(self, n_particles=100, dtype='float32'):
+        ''' zero-padded array [N x n_jets x n_particles x n_features], jets truncated to n_particles '''
+        multiplicity = np.diff(self.offsets)
+        padded = np.zeros((len(multiplicity), n_particles, self.particles.shape[-1]), dtype=dtype)
+        position = np.arange(len(self.particles)) - np.repeat(self.offsets[:-1], multiplicity)
+        jet_idx = np.repeat(np.arange(len(multiplicity)), multiplicity)
+        keep = position < n_particles
+        padded[jet_idx[keep], position[keep]] = self.particles[keep]
+        return padded.reshape(len(self), self.n_jets, n_particles, -1)
@@ -0,0 +1,88 @@
+import os
+import numpy as np
+
+import sarewt.util as ut
+import sarewt.data_writer as dw
+
+PARTICLE_FEAT_NAMES = ['eta', 'phi', 'pt']
+CASE_FEAT_NAMES = ['mJJ', 'DeltaEtaJJ', 'j1Pt', 'j1Eta', 'j1Phi', 'j1M', 'j2Pt', 'j2Eta', 'j2Phi', 'j2M', 'j3Pt', 'j3Eta', 'j3Phi', 'j3M']
+
+
+def generate_jet_constituents(n, n_particles=100, n_features=3, mean_multiplicity=40, rng=None):
+    ''' return zero-padded array of shape [n x 2 x n_particles x n_features] with
+        pt-sorted particles (eta, phi, pt) and poisson distributed jet multiplicity
+    '''
+    rng = rng or np.random.default_rng()
+    constituents = np.zeros((n, 2, n_particles, n_features), dtype='float32')
+    multiplicity = np.clip(rng.poisson(mean_multiplicity, size=(n, 2)), 1, n_particles)
+    filled = np.arange(n_particles) < multiplicity[..., None] # n x 2 x n_particles
+    n_filled = int(filled.sum())
+    constituents[..., 0][filled] = rng.uniform(-0.8, 0.8, n_filled)
+    constituents[..., 1][filled] = rng.uniform(-0.8, 0.8, n_filled)
+    constituents[..., 2][filled] = rng.exponential(5., n_filled)
+    # highest pt particles first, padding stays at the end
+    pt = np.where(filled, constituents[..., 2], -1.)
+    order = np.argsort(-pt, axis=-1, kind='stable')
+    return np.take_along_axis(constituents, order[..., None], axis=2)
+
+
+def generate_dijet_features(n, rng=None):
+    ''' return array of shape [n x 11] with columns ordered as util.FEAT_NAMES '''
+    rng = rng or np.random.default_rng()
+    features = np.zeros((n, len(ut.FEAT_NAMES)), dtype='float32')
+    idx = ut.FEAT_IDX
+    features[:, idx['mJJ']] = 800. + rng.exponential(600., n)
+    features[:, idx['j1Pt']] = 200. + rng.exponential(300., n)
+    features[:, idx['j2Pt']] = 150. + rng.exponential(250., n)
+    features[:, idx['j1Eta']] = rng.uniform(-2.5, 2.5, n)
+    features[:, idx['j1Phi']] = rng.uniform(-np.pi, np.pi, n)
+    features[:, idx['j1M']] = rng.exponential(60., n)
+    features[:, idx['j2M']] = rng.exponential(60., n)
+    features[:, idx['j1E']] = features[:, idx['j1Pt']] * np.cosh(features[:, idx['j1Eta']])
+    features[:, idx['DeltaEtaJJ']] = rng.normal(0., 1.3, n)
+    features[:, idx['j2E']] = features[:, idx['j2Pt']] * np.cosh(features[:, idx['j1Eta']] + features[:, idx['DeltaEtaJJ']])
+    features[:, idx['DeltaPhiJJ']] = rng.uniform(-np.pi, np.pi, n)
+    return features
+
+
+def write_dijet_sample_dir(path, n_files=4, events_per_file=1000, seed=None, encodings=None, **constituents_kwargs):
+    ''' write n_files synthetic files in the jetConstituentsList/eventFeatures layout read by DataReader
+        (encodings: optional constituents storage encodings passed to data_writer)
+        :return: sorted list of written file paths
+    '''
+    rng = np.random.default_rng(seed)
+    os.makedirs(path, exist_ok=True)
+    keys = ['jetConstituentsList', 'particleFeatureNames', 'eventFeatures', 'eventFeatureNames']
+    particle_feature_names = [l.encode('utf-8') for l in PARTICLE_FEAT_NAMES]
+    dijet_feature_names = [l.encode('utf-8') for l in ut.FEAT_NAMES]
+    flist = []
+    for i_file in range(n_files):
+        constituents = generate_jet_constituents(events_per_file, rng=rng, **constituents_kwargs)
+        features = generate_dijet_features(events_per_file, rng=rng)
+        fname = os.path.join(path, 'synthetic_dijet_{:03d}.h5'.format(i_file))
+        dw.write_data_to_file([constituents, particle_feature_names, features, dijet_feature_names], keys, fname, encodings=encodings)
+        flist.append(fname)
+    return flist
+
+
+def write_case_sample_dir(path, n_files=4, events_per_file=1000, seed=None):
+    ''' write n_files synthetic files in the CASE layout (jet1_PFCands, jet2_PFCands, jet_kinematics, truth_label)
+        :return: sorted list of written file paths
+    '''
+    rng = np.random.default_rng(seed)
+    os.makedirs(path, exist_ok=True)
+    keys = ['jet1_PFCands', 'jet2_PFCands', 'jet_kinematics', 'truth_label']
+    flist = []
+    for i_file in range(n_files):
+        jets = []
+        for _ in range(2):
+            eta_phi_pt = generate_jet_constituents(events_per_file, rng=rng)[:, 0]
+            eta, phi, pt = eta_phi_pt[..., 0], eta_phi_pt[..., 1], eta_phi_pt[..., 2]
+            px, py, pz = pt * np.cos(phi), pt * np.sin(phi), pt * np.sinh(eta)
+            jets.append(np.stack([px, py, pz, np.sqrt(px**2 + py**2 + pz**2)], axis=-1).astype('float32'))
+        kinematics = rng.exponential(300., (events_per_file, len(CASE_FEAT_NAMES))).astype('float32')
+        truth_label = rng.integers(0, 2, (events_per_file, 1)).astype('float32')
+        fname = os.path.join(path, 'synthetic_case_{:03d}.h5'.format(i_file))
+        dw.write_data_to_file([jets[0], jets[1], kinematics, truth_label], keys, fname)
+        flist.append(fname)
+    return flist
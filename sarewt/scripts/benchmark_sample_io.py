@@ -0,0 +1,257 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+import numpy as np
+import h5py
+
+import sarewt.data_reader as dare
+import sarewt.data_writer as dw
+import sarewt.util as ut
+import sarewt.sample_generator as sage
+try:
+    import sarewt.parquet_io as paio
+except ImportError: # pyarrow not installed
+    paio = None
+import sarewt.event_to_image_serialization as eis
+
+
+def bench_read_events_from_dir(ctx):
+    constituents, _, features, _ = dare.DataReader(ctx['dijet_dir']).read_events_from_dir()
+    return len(features), constituents.nbytes + features.nbytes
+
+
+def bench_read_encoded_events_from_dir(ctx):
+    constituents, _, features, _ = dare.DataReader(ctx['encoded_dir']).read_events_from_dir()
+    return len(features), constituents.nbytes + features.nbytes
+
+
+def bench_read_jet_features_from_dir(ctx):
+    features, _ = dare.DataReader(ctx['dijet_dir']).read_jet_features_from_dir()
+    return len(features), features.nbytes
+
+
+def bench_parquet_read_jet_features(ctx):
+    features, _ = paio.ParquetFeatureReader(ctx['parquet_dir']).read_jet_features(mJJ=1100.)
+    return len(features), features.nbytes
+
+
+def bench_generate_event_parts_by_num(ctx):
+    n, nbytes = 0, 0
+    for constituents, features in dare.DataReader(ctx['dijet_dir']).generate_event_parts_from_dir(parts_n=ctx['parts_n']):
+        n, nbytes = n + len(features), nbytes + constituents.nbytes + features.nbytes
+    return n, nbytes
+
+
+def bench_generate_event_parts_by_size(ctx):
+    n, nbytes = 0, 0
+    for constituents, features in dare.DataReader(ctx['dijet_dir']).generate_event_parts_from_dir(parts_sz_mb=ctx['parts_sz_mb']):
+        n, nbytes = n + len(features), nbytes + constituents.nbytes + features.nbytes
+    return n, nbytes
+
+
+def bench_get_mask_for_cuts(ctx):
+    features = ctx['features']
+    for cuts in [{'mJJ': 1100.}, {'mJJ': 1100., 'sideband': 1.4}, {'signalregion': 1.4, 'j1Pt': 200., 'j2Pt': 200.}, {'jXPt': 300., 'j1Eta': 2.4, 'j2Eta': 2.4}]:
+        ut.get_mask_for_cuts(features, **cuts)
+    return 4 * len(features), 4 * features.nbytes
+
+
+def bench_bin_data_to_image(ctx):
+    constituents = ctx['constituents'][:ctx['image_n']]
+    serializer = eis.ImageSerializer(ctx['n_bins'])
+    images_j1, images_j2 = serializer.convert_events_to_image(constituents[:, 0], constituents[:, 1])
+    return len(constituents), constituents.nbytes
+
+
+def bench_write_data_to_file(ctx):
+    constituents, features = ctx['constituents'], ctx['features']
+    keys = ['jetConstituentsList', 'particleFeatureNames', 'eventFeatures', 'eventFeatureNames']
+    fname = os.path.join(ctx['work_dir'], 'bench_write.h5')
+    dw.write_data_to_file([constituents, [l.encode('utf-8') for l in sage.PARTICLE_FEAT_NAMES], features, [l.encode('utf-8') for l in ut.FEAT_NAMES]], keys, fname)
+    os.remove(fname)
+    return len(features), constituents.nbytes + features.nbytes
+
+
+def bench_case_read_events_from_dir(ctx):
+    constituents, _, features, _, truth_labels = dare.CaseDataReader(ctx['case_dir']).read_events_from_dir()
+    return len(features), constituents.nbytes + features.nbytes + truth_labels.nbytes
+
+
+BENCHMARKS = {
+    'read_events_from_dir': bench_read_events_from_dir,
+    'read_encoded_events_from_dir': bench_read_encoded_events_from_dir,
+    'read_jet_features_from_dir': bench_read_jet_features_from_dir,
+    'parquet_read_jet_features': bench_parquet_read_jet_features,
+    'generate_event_parts_by_num': bench_generate_event_parts_by_num,
+    'generate_event_parts_by_size': bench_generate_event_parts_by_size,
+    'get_mask_for_cuts': bench_get_mask_for_cuts,
+    'bin_data_to_image': bench_bin_data_to_image,
+    'write_data_to_file': bench_write_data_to_file,
+    'case_read_events_from_dir': bench_case_read_events_from_dir,
+}
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in kB on linux and in bytes on macOS
+    scale = 1024**2 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def time_benchmark(name, ctx, repeats):
+    ''' run benchmark repeats times, keep fastest run
+        peak_rss_increase_mb: growth of peak RSS during the runs over the peak RSS at start (inherited context excluded)
+    '''
+    rss_start = peak_rss_mb()
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        n_events, n_bytes = BENCHMARKS[name](ctx)
+        seconds.append(time.perf_counter() - start)
+    best = min(seconds)
+    return {'seconds': best, 'seconds_all': seconds, 'events': n_events, 'mb': n_bytes / 1024**2,
+            'events_per_s': n_events / best, 'mb_per_s': n_bytes / 1024**2 / best, 'peak_rss_mb': peak_rss_mb(), 'peak_rss_increase_mb': peak_rss_mb() - rss_start}
+
+
+def _run_in_child(conn, name, ctx, repeats):
+    conn.send(time_benchmark(name, ctx, repeats))
+    conn.close()
+
+
+def run_benchmark(name, ctx, repeats):
+    ''' run benchmark in forked process, s.t. peak RSS is measured per benchmark
+        (the child starts at the current RSS of the parent, including the synthetic inputs, only its increase is attributed to the benchmark)
+    '''
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return time_benchmark(name, ctx, repeats)
+    mp = multiprocessing.get_context('fork')
+    parent_conn, child_conn = mp.Pipe(duplex=False)
+    proc = mp.Process(target=_run_in_child, args=(child_conn, name, ctx, repeats))
+    proc.start()
+    result = parent_conn.recv()
+    proc.join()
+    return result
+
+
+# modules loaded by the command line entry points at startup
+IMPORT_MODULES = ['sarewt.cli', 'sarewt.data_reader', 'sarewt.event_concatenate_serialization', 'sarewt.event_to_image_serialization']
+HEAVY_MODULES = ['pandas', 'h5py', 'pyarrow']
+
+
+def measure_import_time(module, repeats=3):
+    ''' cumulative import time of module in a fresh interpreter (python -X importtime), fastest of repeats, and heavy modules it loads '''
+    code = 'import sys, {}; print(" ".join(m for m in {} if m in sys.modules))'.format(module, HEAVY_MODULES)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), os.environ.get('PYTHONPATH')])))
+    seconds = []
+    for _ in range(repeats):
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, env=env, check=True)
+        # line format: 'import time: self [us] | cumulative | imported package', last entry of module is its own import
+        cumulative = [int(line.split('|')[1]) for line in proc.stderr.splitlines() if line.startswith('import time:') and line.split('|')[-1].strip() == module]
+        seconds.append(cumulative[-1] / 1e6)
+    return {'seconds': min(seconds), 'seconds_all': seconds, 'heavy_modules': proc.stdout.split()}
+
+
+def run_import_benchmarks(repeats=3):
+    results = {}
+    for module in IMPORT_MODULES:
+        results[module] = measure_import_time(module, repeats)
+        print('{: <40}: {:8.3f} s import, loads {}'.format(module, results[module]['seconds'], ', '.join(results[module]['heavy_modules']) or '-'))
+    return results
+
+
+def make_context(work_dir, n_files, events_per_file, seed=42):
+    ctx = {'work_dir': work_dir, 'dijet_dir': os.path.join(work_dir, 'dijet'), 'case_dir': os.path.join(work_dir, 'case'),
+           'encoded_dir': os.path.join(work_dir, 'encoded'),
+           'parts_n': events_per_file // 2 + 1, 'parts_sz_mb': 10., 'image_n': min(events_per_file, 500), 'n_bins': 32}
+    sage.write_dijet_sample_dir(ctx['dijet_dir'], n_files=n_files, events_per_file=events_per_file, seed=seed)
+    sage.write_dijet_sample_dir(ctx['encoded_dir'], n_files=n_files, events_per_file=events_per_file, seed=seed, encodings={'jetConstituentsList': 'fixed+trim'})
+    sage.write_case_sample_dir(ctx['case_dir'], n_files=n_files, events_per_file=events_per_file, seed=seed)
+    if paio is not None:
+        ctx['parquet_dir'] = os.path.join(work_dir, 'parquet')
+        with dare.DataReader(ctx['dijet_dir']) as reader:
+            paio.export_features_to_parquet(reader, ctx['parquet_dir'])
+    rng = np.random.default_rng(seed)
+    ctx['constituents'] = sage.generate_jet_constituents(events_per_file, rng=rng)
+    ctx['features'] = sage.generate_dijet_features(events_per_file, rng=rng)
+    return ctx
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(work_dir, n_files, events_per_file, repeats=3, names=None):
+    names = names or [name for name in BENCHMARKS if paio is not None or not name.startswith('parquet')]
+    ctx = make_context(work_dir, n_files, events_per_file)
+    results = {}
+    for name in names:
+        results[name] = run_benchmark(name, ctx, repeats)
+        print('{: <32}: {:8.3f} s {:12.1f} events/s {:10.1f} MB/s {:10.1f} MB peak RSS increase'.format(
+            name, results[name]['seconds'], results[name]['events_per_s'], results[name]['mb_per_s'], results[name]['peak_rss_increase_mb']))
+    meta = {'commit': git_commit(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+            'numpy': np.__version__, 'h5py': h5py.__version__, 'n_files': n_files, 'events_per_file': events_per_file, 'repeats': repeats}
+    return {'meta': meta, 'results': results, 'import_times': run_import_benchmarks(repeats)}
+
+
+def compare_results(current, baseline, tolerance=0.1):
+    ''' compare events/s of current to baseline run
+        :return: list of (name, ratio) for benchmarks slower than baseline by more than tolerance
+    '''
+    regressions = []
+    print('\ncomparing to baseline of commit {}'.format(baseline['meta'].get('commit')))
+    for name, res in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        ratio = res['events_per_s'] / baseline['results'][name]['events_per_s']
+        flag = ratio < 1. - tolerance
+        print('{: <32}: {:6.2f}x {}'.format(name, ratio, 'REGRESSION' if flag else ''))
+        if flag:
+            regressions.append((name, ratio))
+    for module, res in current.get('import_times', {}).items():
+        if module not in baseline.get('import_times', {}):
+            continue
+        ratio = baseline['import_times'][module]['seconds'] / res['seconds']
+        flag = ratio < 1. - tolerance
+        print('{: <32}: {:6.2f}x {}'.format('import ' + module, ratio, 'REGRESSION' if flag else ''))
+        if flag:
+            regressions.append(('import ' + module, ratio))
+    return regressions
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='benchmark read, cut, chunk, image and write paths on synthetic samples')
+    parser.add_argument('-d', dest='work_dir', type=str, help='directory for synthetic samples (default: temporary directory)')
+    parser.add_argument('-f', dest='n_files', type=int, default=4, help='number of files per synthetic sample')
+    parser.add_argument('-n', dest='events_per_file', type=int, default=5000, help='number of events per file')
+    parser.add_argument('-r', dest='repeats', type=int, default=3, help='number of repetitions per benchmark (fastest is kept)')
+    parser.add_argument('-b', dest='names', nargs='+', choices=list(BENCHMARKS), help='benchmarks to run (default: all)')
+    parser.add_argument('-o', dest='outfile', type=str, help='write results as json to outfile')
+    parser.add_argument('--compare', dest='baseline', type=str, help='json results of baseline run to compare to')
+    parser.add_argument('--tolerance', dest='tolerance', type=float, default=0.1, help='allowed relative slowdown before flagging a regression')
+    args = parser.parse_args()
+
+    if args.work_dir:
+        results = run_benchmarks(args.work_dir, args.n_files, args.events_per_file, args.repeats, args.names)
+    else:
+        with tempfile.TemporaryDirectory() as work_dir:
+            results = run_benchmarks(work_dir, args.n_files, args.events_per_file, args.repeats, args.names)
+
+    if args.outfile:
+        with open(args.outfile, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare_results(results, baseline, args.tolerance):
+            sys.exit(1)
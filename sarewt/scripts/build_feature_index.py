@@ -0,0 +1,24 @@
+import sarewt.data_reader as dare
+import sarewt.feature_index as fein
+import argparse
+
+
+def build_feature_index(sample_dir, n_bins=50, chunk_rows=None):
+    print('indexing dijet features of files in {}'.format(sample_dir))
+    with dare.DataReader(sample_dir) as reader:
+        index = fein.FeatureIndex.build(reader, n_bins=n_bins, chunk_rows=chunk_rows)
+    index.save()
+    print('wrote summaries of {} files to {}'.format(len(index.entries), index.index_path(sample_dir)))
+    return index
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='build per-file and per-chunk dijet feature summaries (min/max, histograms) used to skip data failing cuts')
+    parser.add_argument('-d', dest='sample_dirs', type=str, nargs='+', help='sample directories to index')
+    parser.add_argument('-bin', dest='n_bins', type=int, default=50, help='number of histogram bins per feature')
+    parser.add_argument('-rows', dest='chunk_rows', type=int, help='rows per chunk summary (default: hdf5 chunk rows of constituents)')
+    args = parser.parse_args()
+
+    for sample_dir in args.sample_dirs:
+        build_feature_index(sample_dir, args.n_bins, args.chunk_rows)
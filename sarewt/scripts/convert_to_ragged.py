@@ -0,0 +1,35 @@
+import os
+import argparse
+import sarewt.data_reader as dare
+import sarewt.data_writer as dw
+
+
+def convert_file_to_ragged(in_file, out_file):
+    ''' convert zero-padded jetConstituentsList of in_file to ragged constituents (flat particles + per-jet offsets) in out_file '''
+    with dare.DataReader(in_file) as reader:
+        constituents, features = reader.read_ragged_events_from_file()
+        particle_feature_names, dijet_feature_names = reader.read_labels_from_file()
+    keys = [reader.jet_constituents_key, reader.constituents_feature_names, reader.jet_features_key, reader.dijet_feature_names]
+    dw.write_data_to_file([constituents, [l.encode('utf-8') for l in particle_feature_names], features, [l.encode('utf-8') for l in dijet_feature_names]], keys, out_file)
+    print('wrote {} events with mean jet multiplicity {:.1f} to {}'.format(len(features), constituents.multiplicity.mean(), out_file))
+
+
+def convert_dir_to_ragged(in_dir, out_dir):
+    ''' convert all files in in_dir, mirroring directory structure in out_dir '''
+    for in_file in dare.DataReader(in_dir).get_file_list():
+        out_file = os.path.join(out_dir, os.path.relpath(in_file, in_dir))
+        os.makedirs(os.path.dirname(out_file), exist_ok=True)
+        convert_file_to_ragged(in_file, out_file)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='convert zero-padded jet constituents to ragged representation (flat particles + per-jet offsets)')
+    parser.add_argument('-in', dest='inpath', type=str, help='input file or directory')
+    parser.add_argument('-out', dest='outpath', type=str, help='output file or directory')
+    args = parser.parse_args()
+
+    if os.path.isdir(args.inpath):
+        convert_dir_to_ragged(args.inpath, args.outpath)
+    else:
+        convert_file_to_ragged(args.inpath, args.outpath)
@@ -0,0 +1,17 @@
+import sarewt.data_reader as dare
+import sarewt.parquet_io as paio
+import argparse
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='export dijet features of all files in directory to partitioned parquet dataset')
+    parser.add_argument('-in', dest='indir', type=str, help='input sample directory')
+    parser.add_argument('-out', dest='outdir', type=str, help='output parquet directory')
+    parser.add_argument('-rg', dest='row_group_size', type=int, default=64*1024, help='number of events per parquet row group')
+    parser.add_argument('--case', dest='case', action='store_true', help='input in CASE layout (jet_kinematics + truth_label)')
+    args = parser.parse_args()
+
+    reader = dare.CaseDataReader(args.indir) if args.case else dare.DataReader(args.indir)
+    with reader:
+        paio.export_features_to_parquet(reader, args.outdir, args.row_group_size)
@@ -0,0 +1,37 @@
+import os
+import argparse
+import tempfile
+import sarewt.data_reader as dare
+import sarewt.data_writer as dw
+import sarewt.constituents_encoding as coen
+
+
+def report_constituents_encoding(in_file, read_n=None, specs=None):
+    ''' print error and size in memory and on disk (gzip) of each constituents encoding for events of in_file '''
+    with dare.DataReader(in_file) as reader:
+        constituents, _ = reader.read_events_from_file()
+    constituents = constituents[:read_n]
+    specs = specs or ['float32', 'float16', 'fixed', 'trim', 'float16+trim', 'fixed+trim']
+    report = coen.encoding_report(constituents, specs)
+
+    print('{} events, mean jet multiplicity {:.1f}\n'.format(len(constituents), coen.get_multiplicity(constituents).mean()))
+    print('{: <14} {: >10} {: >10} {: >10} {: >32} {: >12}'.format('encoding', 'mem [MB]', 'mem ratio', 'disk [MB]', 'max abs err per feature', 'max rel pt'))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rep in report:
+            fname = os.path.join(tmp_dir, 'encoded.h5')
+            dw.write_data_to_file([constituents], ['jetConstituentsList'], fname, encodings={'jetConstituentsList': rep['spec']})
+            rep['disk_bytes'] = os.path.getsize(fname)
+            print('{: <14} {: >10.2f} {: >10.2f} {: >10.2f} {: >32} {: >12.2e}'.format(rep['spec'], rep['bytes'] / 1024**2, rep['size_ratio'], rep['disk_bytes'] / 1024**2,
+                ' '.join('{:.1e}'.format(e) for e in rep['max_abs_err']), rep['max_rel_err_pt']))
+    return report
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='report accuracy and size of constituents storage encodings')
+    parser.add_argument('-in', dest='infile', type=str, help='input file name/path')
+    parser.add_argument('-n', dest='num_evts', type=int, help='number of events to evaluate')
+    parser.add_argument('-e', dest='specs', type=str, nargs='+', help='encodings to evaluate (default: all)')
+    args = parser.parse_args()
+
+    report_constituents_encoding(args.infile, args.num_evts, args.specs)
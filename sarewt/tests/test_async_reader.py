@@ -0,0 +1,155 @@
+import os
+import json
+import uuid
+import time
+import asyncio
+import unittest
+import tempfile
+import numpy as np
+import sarewt.data_reader as dare
+import sarewt.async_reader as asre
+import sarewt.file_pool as fp
+import sarewt.sample_generator as sage
+
+
+
+class TracingDataReader(dare.DataReader):
+	''' records (pid, start, stop) of each file read (in worker thread or process) to trace_dir '''
+
+	def __init__(self, path, trace_dir):
+		dare.DataReader.__init__(self, path)
+		self.trace_dir = trace_dir
+
+	def trace(self, read, *args, **kwargs):
+		start = time.time()
+		time.sleep(0.2)
+		result = read(*args, **kwargs)
+		with open(os.path.join(self.trace_dir, '{}.json'.format(uuid.uuid4().hex)), 'w') as f:
+			json.dump([os.getpid(), start, time.time()], f)
+		return result
+
+	def read_jet_features_from_file(self, path=None, **cuts):
+		return self.trace(dare.DataReader.read_jet_features_from_file, self, path, **cuts)
+
+	def read_events_from_file(self, fname=None, **cuts):
+		return self.trace(dare.DataReader.read_events_from_file, self, fname, **cuts)
+
+	def read_traces(self):
+		return [json.load(open(os.path.join(self.trace_dir, fname))) for fname in os.listdir(self.trace_dir)]
+
+
+
+class AsyncDataReaderTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.dirs = [os.path.join(self.tmp_dir.name, 'sample_{}'.format(i)) for i in range(3)]
+		for i, sample_dir in enumerate(self.dirs):
+			sage.write_dijet_sample_dir(sample_dir, n_files=3, events_per_file=100, seed=i)
+		self.max_concurrency = asre.get_max_concurrency()
+		asre.set_max_concurrency(2)
+
+	def tearDown(self):
+		asre.set_max_concurrency(self.max_concurrency)
+		asre.set_executor_kind('thread')
+		asre.shutdown_executor()
+		self.tmp_dir.cleanup()
+
+
+	def test_read_dir(self):
+		cuts = {'mJJ': 1100.}
+		constituents, names, features, feature_names = dare.DataReader(self.dirs[0]).read_events_from_dir(**cuts)
+
+		async def read():
+			async with asre.AsyncDataReader(self.dirs[0]) as reader:
+				return await reader.read_events_from_dir(**cuts), await reader.read_jet_features_from_dir(features_to_df=True, **cuts), await reader.read_jet_features_from_dir(read_n=150)
+
+		(constituents_async, names_async, features_async, _), (df, _), (features_n, _) = asyncio.run(read())
+		self.assertEqual(names_async, names)
+		np.testing.assert_array_equal(constituents_async, constituents)
+		np.testing.assert_array_equal(features_async, features)
+		np.testing.assert_array_equal(df.values, features)
+		self.assertEqual(list(df.columns), feature_names)
+		self.assertEqual(len(features_n), 150)
+
+
+	def test_async_chunks(self):
+		async def read_chunks():
+			reader = asre.AsyncDataReader(self.dirs[1])
+			return [chunk async for chunk in reader.generate_event_parts_from_dir(parts_n=120)]
+
+		chunks = asyncio.run(read_chunks())
+		self.assertEqual([len(f) for _, f in chunks], [120, 120, 60])
+		_, _, features, _ = dare.DataReader(self.dirs[1]).read_events_from_dir()
+		np.testing.assert_array_equal(np.concatenate([f for _, f in chunks]), features)
+
+
+	def test_concurrent_dirs_bounded(self):
+		for kind, n_pids in [('thread', 1), ('process', 2)]:
+			with self.subTest(kind=kind):
+				asre.set_executor_kind(kind)
+				trace_dir = os.path.join(self.tmp_dir.name, 'trace_' + kind)
+				os.makedirs(trace_dir)
+				readers = [TracingDataReader(sample_dir, trace_dir) for sample_dir in self.dirs]
+
+				async def read():
+					return await asyncio.gather(*[asre.AsyncDataReader(reader).read_jet_features_from_dir(mJJ=1100.) for reader in readers])
+
+				results = asyncio.run(read())
+				intervals = readers[0].read_traces()
+				self.assertEqual(len(intervals), 9)
+				edges = sorted([(start, 1) for _, start, _ in intervals] + [(stop, -1) for _, _, stop in intervals])
+				self.assertEqual(max(np.cumsum([step for _, step in edges])), 2) # reads overlap, bounded by max concurrency
+				self.assertEqual(len(set(pid for pid, _, _ in intervals)), n_pids)
+				for sample_dir, (features, _) in zip(self.dirs, results):
+					np.testing.assert_array_equal(features, dare.DataReader(sample_dir).read_jet_features_from_dir(mJJ=1100.)[0])
+
+
+	def test_chunks_prefetch_bounded_and_cancelled_on_break(self):
+		asre.set_max_concurrency(1)
+		trace_dir = os.path.join(self.tmp_dir.name, 'trace')
+		os.makedirs(trace_dir)
+		sage.write_dijet_sample_dir(self.dirs[0], n_files=6, events_per_file=100, seed=0)
+		reader = TracingDataReader(self.dirs[0], trace_dir)
+
+		async def read_first_chunk():
+			async for chunk in asre.AsyncDataReader(reader).generate_event_parts_from_dir(parts_n=50, prefetch=2):
+				break
+			await asyncio.sleep(1.) # reads not cancelled would complete meanwhile
+			return chunk
+
+		constituents, features = asyncio.run(read_first_chunk())
+		self.assertEqual(len(features), 50)
+		# first file consumed, of the two files read ahead (prefetch) the queued one is cancelled before it starts
+		self.assertIn(len(reader.read_traces()), (1, 2))
+
+
+	def test_case_reader_events_with_truth_labels(self):
+		case_dir = os.path.join(self.tmp_dir.name, 'case')
+		sage.write_case_sample_dir(case_dir, n_files=3, events_per_file=50, seed=7)
+		events = dare.CaseDataReader(case_dir).read_events_from_dir()
+		events_async = asyncio.run(asre.AsyncDataReader(dare.CaseDataReader(case_dir)).read_events_from_dir())
+		self.assertEqual(len(events_async), 5)
+		for value, value_async in zip(events, events_async):
+			np.testing.assert_array_equal(value_async, value)
+		with self.assertRaises(TypeError):
+			asyncio.run(asre.AsyncDataReader(dare.CaseDataReader(case_dir)).read_events_from_dir(mJJ=1100.))
+
+
+	def test_async_ragged_chunks_and_caller_pool_untouched(self):
+		pool = fp.H5FilePool(max_open=1)
+		async def read_chunks():
+			async with asre.AsyncDataReader(dare.DataReader(self.dirs[2], file_pool=pool)) as reader:
+				return [chunk async for chunk in reader.generate_ragged_event_parts_from_dir(parts_n=70, pad=True)]
+
+		chunks = asyncio.run(read_chunks())
+		self.assertEqual([len(f) for _, f in chunks], [70, 70, 70, 70, 20])
+		constituents, _, features, _ = dare.DataReader(self.dirs[2]).read_events_from_dir()
+		np.testing.assert_array_equal(np.concatenate([c for c, _ in chunks]), constituents)
+		self.assertEqual(pool.max_open, 1)
+		self.assertEqual(len(pool), 0)
+
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,93 @@
+import os
+import sys
+import unittest
+import tempfile
+import subprocess
+import numpy as np
+import sarewt.cli as cli
+import sarewt.data_reader as dare
+import sarewt.sample_generator as sage
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def loaded_modules(module, candidates):
+	''' import module in fresh interpreter and return which of candidates got loaded '''
+	code = 'import sys, {}; print(" ".join(m for m in {} if m in sys.modules))'.format(module, candidates)
+	env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT_DIR, os.environ.get('PYTHONPATH')])))
+	return subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env, check=True).stdout.split()
+
+
+
+class CliTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.sample_dir = os.path.join(self.tmp_dir.name, 'sample')
+		sage.write_dijet_sample_dir(self.sample_dir, n_files=2, events_per_file=30, seed=5)
+
+	def tearDown(self):
+		self.tmp_dir.cleanup()
+
+
+	def test_startup_imports_are_deferred(self):
+		self.assertEqual(loaded_modules('sarewt.cli', ['numpy', 'h5py', 'pandas']), [])
+		self.assertEqual(loaded_modules('sarewt.data_reader', ['h5py', 'pandas']), [])
+		self.assertNotIn('pandas', loaded_modules('sarewt.event_concatenate_serialization', ['pandas']))
+
+
+	def test_concat(self):
+		out_file = os.path.join(self.tmp_dir.name, 'concat.h5')
+		cli.main(['concat', '-in', self.sample_dir, '-out', out_file, '--side'])
+		with dare.DataReader(out_file) as reader:
+			constituents, features = reader.read_events_from_file()
+		with dare.DataReader(self.sample_dir) as reader:
+			_, _, features_in, _ = reader.read_events_from_dir(sideband=1.4, mJJ=1100.)
+		self.assertEqual(len(constituents), len(features_in))
+		np.testing.assert_array_equal(features, features_in)
+
+
+	def test_concat_rejects_ignored_options(self):
+		out_file = os.path.join(self.tmp_dir.name, 'concat.h5')
+		for argv in (['--append', '-enc', 'fixed+trim'], ['--append', '-n', '10'], ['--job', '-n', '10'], ['-mb', '1', '-n', '10'], ['--job', '-mb', '1'], ['-j', '2'], ['-fpu', '2']):
+			with self.assertRaises(SystemExit):
+				cli.main(['concat', '-in', self.sample_dir, '-out', out_file] + argv)
+		self.assertFalse(os.path.exists(out_file))
+
+
+	def test_concat_append_encoded_parts(self):
+		out_file = os.path.join(self.tmp_dir.name, 'concat.h5')
+		cli.main(['concat', '-in', self.sample_dir, '-out', out_file, '--append', '-mb', '1', '-enc', 'fixed+trim'])
+		part_file = os.path.join(self.tmp_dir.name, 'concat_000.h5')
+		with dare.DataReader(part_file) as reader, reader.file_pool.open(part_file) as f:
+			self.assertEqual(f['jetConstituentsList'].attrs['encoding'], 'fixed+trim')
+			features = reader.read_jet_features_from_file()
+		with dare.DataReader(self.sample_dir) as reader:
+			_, _, features_in, _ = reader.read_events_from_dir(mJJ=1100.)
+		np.testing.assert_array_equal(features, features_in)
+
+
+	def test_images(self):
+		out_file = os.path.join(self.tmp_dir.name, 'images.h5')
+		cli.main(['images', '-in', dare.DataReader(self.sample_dir).get_file_list()[0], '-out', out_file, '-bin', '8', '-n', '10'])
+		with dare.DataReader(out_file) as reader:
+			images = reader.read_data_from_file('images_j1_j2')
+			features = reader.read_jet_features_from_file()
+		self.assertEqual(images.shape, (2, len(features), 8, 8))
+		self.assertLessEqual(len(features), 10)
+
+
+	def test_materialize_requires_outdir(self):
+		with self.assertRaises(SystemExit):
+			cli.main(['materialize', 'ragged', '-in', self.sample_dir])
+
+
+	def test_module_entry_point(self):
+		env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT_DIR, os.environ.get('PYTHONPATH')])))
+		proc = subprocess.run([sys.executable, '-m', 'sarewt', 'count', '-d', self.tmp_dir.name], capture_output=True, text=True, env=env)
+		self.assertEqual(proc.returncode, 0, proc.stderr)
+		self.assertIn('60', proc.stdout)
+
+
+if __name__ == '__main__':
+	unittest.main()
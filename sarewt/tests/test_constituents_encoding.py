@@ -0,0 +1,94 @@
+import os
+import unittest
+import tempfile
+import numpy as np
+import sarewt.data_reader as dare
+import sarewt.data_writer as dw
+import sarewt.constituents_encoding as coen
+import sarewt.sample_generator as sage
+
+
+
+class ConstituentsEncodingTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.constituents = sage.generate_jet_constituents(300, rng=np.random.default_rng(1))
+
+	def tearDown(self):
+		self.tmp_dir.cleanup()
+
+
+	def test_parse_encoding(self):
+		self.assertEqual(coen.parse_encoding('fixed+trim'), ('fixed', True))
+		self.assertEqual(coen.parse_encoding('trim'), ('float32', True))
+		self.assertEqual(coen.parse_encoding('float16'), ('float16', False))
+		with self.assertRaises(ValueError):
+			coen.parse_encoding('float16+fixed')
+		with self.assertRaises(ValueError):
+			coen.parse_encoding('int8')
+
+
+	def test_multiplicity(self):
+		constituents = np.zeros((2, 2, 5, 3))
+		constituents[0, 0, :3] = 1.
+		constituents[1, 1, :5] = 1.
+		constituents[1, 1, 2] = 0. # zero particle within jet counted
+		np.testing.assert_array_equal(coen.get_multiplicity(constituents), [[3, 0], [0, 5]])
+
+
+	def test_encode_decode(self):
+		max_err = {'float32': 0., 'trim': 0., 'float16': 1e-3, 'fixed': 2e-5, 'fixed+trim': 2e-5}
+		for spec, err in max_err.items():
+			data, attrs, extras = coen.encode_constituents(self.constituents, spec)
+			decoded = coen.decode_constituents(data, attrs, extras)
+			self.assertEqual(decoded.shape, self.constituents.shape)
+			self.assertEqual(decoded.dtype, np.float32)
+			np.testing.assert_allclose(decoded[..., :2], self.constituents[..., :2], rtol=0, atol=err)
+			np.testing.assert_allclose(decoded[..., 2], self.constituents[..., 2], rtol=err, atol=0)
+			self.assertTrue(np.all(decoded[self.constituents == 0] == 0)) # padding stays zero
+		report = coen.encoding_report(self.constituents, ['float16', 'fixed+trim'])
+		self.assertAlmostEqual(report[0]['size_ratio'], 0.5)
+		self.assertLess(report[1]['size_ratio'], 0.67)
+
+
+	def test_trim_per_jet(self):
+		constituents = self.constituents.copy()
+		constituents[0, 0, :] = 1. # single full jet
+		multiplicity = coen.get_multiplicity(constituents)
+		data, attrs, extras = coen.encode_constituents(constituents, 'trim')
+		self.assertEqual(data.shape, (multiplicity.sum(), 3))
+		np.testing.assert_array_equal(coen.decode_constituents(data, attrs, extras), constituents)
+		report, = coen.encoding_report(constituents, ['trim'])
+		self.assertAlmostEqual(report['size_ratio'], multiplicity.mean() / 100., delta=0.01)
+
+
+	def test_read_trimmed_row_ranges(self):
+		fname = os.path.join(self.tmp_dir.name, 'trimmed.h5')
+		features = sage.generate_dijet_features(len(self.constituents), rng=np.random.default_rng(2))
+		dw.write_data_to_file([self.constituents, features], ['jetConstituentsList', 'eventFeatures'], fname, encodings={'jetConstituentsList': 'fixed+trim'})
+		row_ranges = [(0, 10), (50, 51), (200, 300)]
+		with dare.DataReader(fname) as reader, reader.file_pool.open(fname) as f:
+			constituents = reader.read_constituents_rows(f, 'jetConstituentsList', row_ranges)
+		expected = np.concatenate([self.constituents[start:stop] for start, stop in row_ranges])
+		np.testing.assert_allclose(constituents, expected, atol=2e-5, rtol=0)
+		self.assertTrue(np.all(constituents[expected == 0] == 0))
+
+
+	def test_read_encoded_files(self):
+		plain_dir, encoded_dir = os.path.join(self.tmp_dir.name, 'plain'), os.path.join(self.tmp_dir.name, 'encoded')
+		sage.write_dijet_sample_dir(plain_dir, n_files=2, events_per_file=150, seed=3)
+		sage.write_dijet_sample_dir(encoded_dir, n_files=2, events_per_file=150, seed=3, encodings={'jetConstituentsList': 'fixed+trim'})
+		cuts = {'mJJ': 1100.}
+		constituents, _, features, _ = dare.DataReader(plain_dir).read_events_from_dir(**cuts)
+		constituents_enc, names, features_enc, _ = dare.DataReader(encoded_dir).read_events_from_dir(**cuts)
+		self.assertEqual(len(names), 3)
+		np.testing.assert_array_equal(features_enc, features)
+		np.testing.assert_allclose(constituents_enc, constituents, atol=2e-5, rtol=0)
+		constituents_file = dare.DataReader(os.path.join(encoded_dir, 'synthetic_dijet_000.h5')).read_constituents_from_file()
+		self.assertEqual(constituents_file.shape, (150, 2, 100, 3))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,134 @@
+import os
+import time
+import json
+import unittest
+from unittest import mock
+import tempfile
+import numpy as np
+import sarewt.data_reader as dare
+import sarewt.sample_generator as sage
+import sarewt.conversion_job as cojo
+import sarewt.event_concatenate_serialization as ecs
+import sarewt.event_to_image_serialization as eis
+
+
+
+def failing_convert(in_files, out_file):
+	with open(out_file, 'w') as f:
+		f.write('partial')
+	raise OSError('node preempted')
+
+
+
+class ConversionJobTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.in_dir = os.path.join(self.tmp_dir.name, 'in')
+		self.out_file = os.path.join(self.tmp_dir.name, 'out', 'concat.h5')
+		self.flist = sage.write_dijet_sample_dir(self.in_dir, n_files=5, events_per_file=50, seed=3)
+
+	def tearDown(self):
+		self.tmp_dir.cleanup()
+
+	def run_concat(self, **kwargs):
+		return ecs.read_concat_write_job(self.in_dir, self.out_file, files_per_unit=2, side=True, sigreg=False, **kwargs)
+
+	def part_path(self, i):
+		return self.out_file[:-3] + '_{:03d}.h5'.format(i)
+
+
+	def test_concat_job_output_and_resume(self):
+		summary = self.run_concat()
+		self.assertEqual(summary['done'], ['000', '001', '002'])
+		with dare.DataReader(os.path.dirname(self.out_file)) as reader:
+			constituents, _, features, _ = reader.read_events_from_dir()
+		with dare.DataReader(self.in_dir) as reader:
+			constituents_in, _, features_in, _ = reader.read_events_from_dir(**ecs.get_cuts(True, False))
+		np.testing.assert_array_equal(features, features_in)
+		np.testing.assert_array_equal(constituents, constituents_in)
+		self.assertEqual(sorted(os.listdir(os.path.dirname(self.out_file))), ['concat.h5.job'] + ['concat_{:03d}.h5'.format(i) for i in range(3)])
+
+		record = json.load(open(os.path.join(self.out_file + '.job', '001.json')))
+		self.assertEqual([inp['path'] for inp in record['inputs']], self.flist[2:4])
+		self.assertEqual(record['output']['sha256'], cojo.file_checksum(self.part_path(1)))
+
+		summary = self.run_concat()
+		self.assertEqual(summary['skipped'], ['000', '001', '002'])
+
+
+	def test_redo_units_with_corrupt_output_or_changed_input(self):
+		self.run_concat()
+		with open(self.part_path(0), 'r+b') as f: # same size, different content
+			f.seek(-8, os.SEEK_END)
+			f.write(b'\xff' * 8)
+		sage.write_dijet_sample_dir(os.path.join(self.tmp_dir.name, 'new'), n_files=1, events_per_file=60, seed=4)
+		os.replace(os.path.join(self.tmp_dir.name, 'new', 'synthetic_dijet_000.h5'), self.flist[4])
+		self.assertEqual(self.run_concat(verify='size')['done'], ['002'])
+		summary = self.run_concat()
+		self.assertEqual(summary['done'], ['000'])
+		self.assertEqual(summary['skipped'], ['001', '002'])
+		# touched input with unchanged content: checksum matches, unit kept
+		os.utime(self.flist[1], (0, 0))
+		self.assertEqual(self.run_concat()['skipped'], ['000', '001', '002'])
+		# changed parameters: all units redone
+		self.assertEqual(self.run_concat(encoding='float16')['done'], ['000', '001', '002'])
+
+
+	def test_locked_units_skipped_and_stale_locks_broken(self):
+		os.makedirs(self.out_file + '.job')
+		lock = cojo.UnitLock(os.path.join(self.out_file + '.job', '001.lock'), stale_after=60.)
+		self.assertTrue(lock.acquire())
+		self.assertFalse(cojo.UnitLock(lock.path).acquire())
+		summary = self.run_concat()
+		self.assertEqual(summary['busy'], ['001'])
+		self.assertFalse(os.path.exists(self.part_path(1)))
+		lock.release()
+
+		open(lock.path, 'w').close()
+		os.utime(lock.path, (time.time() - 3600, time.time() - 3600)) # lock of preempted worker
+		summary = self.run_concat()
+		self.assertEqual(summary['done'], ['001'])
+		self.assertFalse(os.path.exists(lock.path))
+
+
+	def test_stale_lock_broken_by_one_worker_only(self):
+		path = os.path.join(self.tmp_dir.name, 'unit.lock')
+		open(path, 'w').close()
+		os.utime(path, (time.time() - 3600, time.time() - 3600))
+		lock_a, lock_b = cojo.UnitLock(path, stale_after=60.), cojo.UnitLock(path, stale_after=60.)
+		self.assertTrue(lock_a.acquire())
+		# worker b found the lock stale before worker a broke it, moved lock of a is found live and put back
+		is_stale = lock_b.is_stale
+		with mock.patch.object(lock_b, 'is_stale', side_effect=lambda path=None: path is None or is_stale(path)):
+			self.assertFalse(lock_b.acquire())
+		self.assertEqual(lock_a.read_owner()['token'], lock_a.token)
+		lock_b.release()
+		self.assertTrue(os.path.exists(path))
+		lock_a.release()
+		self.assertEqual(os.listdir(self.tmp_dir.name), ['in'])
+
+
+	def test_failed_unit_leaves_no_output(self):
+		out_dir = os.path.join(self.tmp_dir.name, 'failed')
+		job = cojo.ConversionJob(cojo.units_by_file(self.in_dir, out_dir, self.flist[:2]), failing_convert, os.path.join(out_dir, '.job'))
+		summary = job.run()
+		self.assertEqual(len(summary['failed']), 2)
+		self.assertEqual(os.listdir(out_dir), ['.job'])
+		self.assertEqual(os.listdir(os.path.join(out_dir, '.job')), [])
+
+
+	def test_images_job_parallel_workers(self):
+		out_dir = os.path.join(self.tmp_dir.name, 'images')
+		summary = eis.convert_dir_to_images_job(self.in_dir, out_dir, n_bins=8, n_evts=int(1e9), n_workers=2)
+		self.assertEqual(sorted(summary['done']), sorted(os.path.basename(f) for f in self.flist))
+		with dare.DataReader(os.path.join(out_dir, 'synthetic_dijet_000.h5')) as reader:
+			images = reader.read_data_from_file('images_j1_j2')
+		self.assertEqual(images.shape[0], 2)
+		self.assertEqual(images.shape[2:], (8, 8))
+		summary = eis.convert_dir_to_images_job(self.in_dir, out_dir, n_bins=8, n_evts=int(1e9), n_workers=2)
+		self.assertEqual(len(summary['skipped']), len(self.flist))
+
+
+if __name__ == '__main__':
+	unittest.main()
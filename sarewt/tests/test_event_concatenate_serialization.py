@@ -0,0 +1,96 @@
+import os
+import unittest
+from unittest import mock
+import tempfile
+import numpy as np
+import sarewt.data_reader as dare
+import sarewt.sample_generator as sage
+import sarewt.event_concatenate_serialization as ecs
+
+
+
+class IncrementalConcatTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.in_dir = os.path.join(self.tmp_dir.name, 'in')
+		self.out_file = os.path.join(self.tmp_dir.name, 'out', 'concat.h5')
+		os.makedirs(os.path.dirname(self.out_file))
+		sage.write_dijet_sample_dir(self.in_dir, n_files=3, events_per_file=100, seed=1)
+
+	def tearDown(self):
+		self.tmp_dir.cleanup()
+
+	def add_input_file(self, name, seed):
+		new_dir = os.path.join(self.tmp_dir.name, 'new_{}'.format(seed))
+		fname, = sage.write_dijet_sample_dir(new_dir, n_files=1, events_per_file=100, seed=seed)
+		os.rename(fname, os.path.join(self.in_dir, name))
+
+	def read_expected(self, cuts):
+		constituents, _, features, _ = dare.DataReader(self.in_dir).read_events_from_dir(**cuts)
+		return constituents, features
+
+
+	def test_append_single_file(self):
+		cuts = ecs.get_cuts(side=True, sigreg=False)
+		manifest = ecs.read_concat_append(self.in_dir, self.out_file, None, True, False)
+		self.assertEqual(len(manifest['inputs']), 3)
+
+		self.add_input_file('synthetic_dijet_100.h5', seed=7)
+		with mock.patch.object(ecs.dr.DataReader, 'read_events_from_file', autospec=True, side_effect=ecs.dr.DataReader.read_events_from_file) as read_mock:
+			manifest = ecs.read_concat_append(self.in_dir, self.out_file, None, True, False)
+		self.assertEqual([os.path.basename(c.args[1]) for c in read_mock.call_args_list], ['synthetic_dijet_100.h5'])
+		self.assertEqual(len(manifest['inputs']), 4)
+
+		constituents_expected, features_expected = self.read_expected(cuts)
+		with dare.DataReader(self.out_file) as reader:
+			constituents, features = reader.read_events_from_file()
+			self.assertEqual(reader.read_labels_from_file(), manifest['feature_names'])
+		np.testing.assert_array_equal(features, features_expected)
+		np.testing.assert_array_equal(constituents, constituents_expected)
+
+		# nothing new to append
+		manifest = ecs.read_concat_append(self.in_dir, self.out_file, None, True, False)
+		self.assertEqual(len(manifest['inputs']), 4)
+
+
+	def test_interrupted_append_not_duplicated(self):
+		ecs.read_concat_append(self.in_dir, self.out_file, None, True, False)
+		self.add_input_file('synthetic_dijet_100.h5', seed=7)
+		# crash after events were appended, before manifest records the input file
+		with mock.patch.object(ecs, 'write_manifest', side_effect=OSError('killed')):
+			with self.assertRaises(OSError):
+				ecs.read_concat_append(self.in_dir, self.out_file, None, True, False)
+		manifest = ecs.read_concat_append(self.in_dir, self.out_file, None, True, False)
+		constituents_expected, features_expected = self.read_expected(ecs.get_cuts(side=True, sigreg=False))
+		with dare.DataReader(self.out_file) as reader:
+			constituents, features = reader.read_events_from_file()
+		np.testing.assert_array_equal(features, features_expected)
+		np.testing.assert_array_equal(constituents, constituents_expected)
+		self.assertEqual(manifest['n_events'], len(features_expected))
+		self.assertEqual(sum(inp['n_events'] for inp in manifest['inputs']), len(features_expected))
+
+
+	def test_append_file_parts(self):
+		ecs.read_concat_append(self.in_dir, self.out_file, 1, False, False)
+		self.add_input_file('synthetic_dijet_100.h5', seed=7)
+		manifest = ecs.read_concat_append(self.in_dir, self.out_file, 1, False, False)
+		self.assertEqual(manifest['parts_n'], 2)
+		_, features_expected = self.read_expected(ecs.get_cuts(False, False))
+		features, _ = dare.DataReader(os.path.dirname(self.out_file)).read_jet_features_from_dir()
+		np.testing.assert_array_equal(features, features_expected)
+
+
+	def test_changed_input_or_cuts_rejected(self):
+		ecs.read_concat_append(self.in_dir, self.out_file, None, False, False)
+		with self.assertRaises(ValueError):
+			ecs.read_concat_append(self.in_dir, self.out_file, None, True, False)
+		fname = sorted(os.listdir(self.in_dir))[0]
+		os.utime(os.path.join(self.in_dir, fname), (0, 0))
+		with self.assertRaises(ValueError):
+			ecs.read_concat_append(self.in_dir, self.out_file, None, False, False)
+
+
+
+if __name__ == '__main__':
+	unittest.main()
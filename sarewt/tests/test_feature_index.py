@@ -0,0 +1,115 @@
+import os
+import unittest
+import tempfile
+import numpy as np
+import h5py
+import sarewt.data_reader as dare
+import sarewt.feature_index as fi
+import sarewt.sample_generator as sage
+import sarewt.data_writer as dw
+import sarewt.util as ut
+
+
+
+class FeatureIndexTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.dir_path = self.tmp_dir.name
+		self.flist = sage.write_dijet_sample_dir(self.dir_path, n_files=3, events_per_file=400, seed=1)
+		# file with low mJJ only (no event passing mJJ > 1100)
+		features = sage.generate_dijet_features(400, rng=np.random.default_rng(5))
+		features[:, ut.FEAT_IDX['mJJ']] = np.linspace(500., 1000., 400)
+		keys = ['jetConstituentsList', 'particleFeatureNames', 'eventFeatures', 'eventFeatureNames']
+		self.low_mjj_file = os.path.join(self.dir_path, 'synthetic_dijet_low_mjj.h5')
+		dw.write_data_to_file([sage.generate_jet_constituents(400), [b'eta', b'phi', b'pt'], features, [l.encode('utf-8') for l in ut.FEAT_NAMES]], keys, self.low_mjj_file)
+		with dare.DataReader(self.dir_path) as reader:
+			fi.FeatureIndex.build(reader, chunk_rows=100).save()
+
+	def tearDown(self):
+		self.tmp_dir.cleanup()
+
+
+	def test_may_pass_cuts(self):
+		mins, maxs = np.zeros((2, 11)), np.ones((2, 11))
+		maxs[0, ut.FEAT_IDX['mJJ']] = 2000.
+		mins[:, ut.FEAT_IDX['DeltaEtaJJ']], maxs[:, ut.FEAT_IDX['DeltaEtaJJ']] = [1.5, -1.], [2., 1.]
+		np.testing.assert_array_equal(fi.may_pass_cuts(mins, maxs, mJJ=1100.), [True, False])
+		np.testing.assert_array_equal(fi.may_pass_cuts(mins, maxs, signalregion=1.4), [False, True])
+		np.testing.assert_array_equal(fi.may_pass_cuts(mins, maxs, sideband=1.4), [True, False])
+		np.testing.assert_array_equal(fi.may_pass_cuts(mins, maxs, jXPt=0.5, j2Eta=2.4), [True, True])
+
+
+	def test_pruned_reads_equal_full_reads(self):
+		for cuts in [{'mJJ': 1100.}, {'mJJ': 2500., 'sideband': 1.4}, {'signalregion': 0.2, 'j1Pt': 800.}, {'jXPt': 300., 'j1Eta': 1., 'j2Eta': 2.4}]:
+			constituents, _, features, _ = dare.DataReader(self.dir_path).read_events_from_dir(**cuts)
+			reader = dare.DataReader(self.dir_path)
+			self.assertIsNotNone(reader.load_feature_index())
+			constituents_pruned, _, features_pruned, _ = reader.read_events_from_dir(**cuts)
+			features_only, _ = reader.read_jet_features_from_dir(**cuts)
+			np.testing.assert_array_equal(features_pruned, features)
+			np.testing.assert_array_equal(constituents_pruned, constituents)
+			np.testing.assert_array_equal(features_only, features)
+
+
+	def test_skip_file_and_chunks(self):
+		index = fi.FeatureIndex.load(self.dir_path)
+		self.assertFalse(index.may_pass(self.low_mjj_file, mJJ=1100.))
+		self.assertEqual(index.selected_row_ranges(self.low_mjj_file, mJJ=1100.), [])
+		self.assertEqual(index.selected_row_ranges(self.low_mjj_file, mJJ=900.), [(300, 400)])
+		reader = dare.DataReader(self.dir_path, feature_index=index)
+		opened = []
+		open_file = reader.file_pool._open
+		reader.file_pool._open = lambda path: opened.append(path) or open_file(path)
+		reader.read_events_from_file(self.low_mjj_file, mJJ=1100.)
+		self.assertEqual(opened, [])
+
+
+	def test_nan_features_do_not_prune_passing_events(self):
+		features = sage.generate_dijet_features(400, rng=np.random.default_rng(6))
+		features[:, ut.FEAT_IDX['mJJ']] = 1500.
+		features[150, ut.FEAT_IDX['mJJ']] = np.nan
+		features[200:300, ut.FEAT_IDX['j1Pt']] = np.nan
+		keys = ['jetConstituentsList', 'particleFeatureNames', 'eventFeatures', 'eventFeatureNames']
+		nan_file = os.path.join(self.dir_path, 'synthetic_dijet_nan.h5')
+		dw.write_data_to_file([sage.generate_jet_constituents(400), [b'eta', b'phi', b'pt'], features, [l.encode('utf-8') for l in ut.FEAT_NAMES]], keys, nan_file)
+		with dare.DataReader(self.dir_path) as reader:
+			index = fi.FeatureIndex.build(reader, flist=[nan_file], chunk_rows=100)
+		entry = index.get_entry(nan_file)
+		self.assertEqual(entry['min'][ut.FEAT_IDX['mJJ']], 1500.)
+		self.assertEqual(entry['chunk_max'][2][ut.FEAT_IDX['j1Pt']], np.inf)
+		self.assertEqual(sum(entry['hist_counts'][ut.FEAT_IDX['mJJ']]), 399)
+		for cuts in [{'mJJ': 1100.}, {'j1Pt': 0.}]:
+			self.assertEqual(index.selected_row_ranges(nan_file, **cuts), [(0, 400)])
+			features_pruned = dare.DataReader(nan_file, feature_index=index).read_jet_features_from_file(**cuts)
+			np.testing.assert_array_equal(features_pruned, dare.DataReader(nan_file).read_jet_features_from_file(**cuts))
+
+
+	def test_chunk_rows_of_trimmed_constituents_from_features(self):
+		constituents = np.zeros((400, 2, 100, 3), dtype='float32')
+		constituents[:, 0, 0] = 1. # as many particles as events
+		keys = ['jetConstituentsList', 'particleFeatureNames', 'eventFeatures', 'eventFeatureNames']
+		trim_file = os.path.join(self.dir_path, 'synthetic_dijet_trim.h5')
+		dw.write_data_to_file([constituents, [b'eta', b'phi', b'pt'], sage.generate_dijet_features(400), [l.encode('utf-8') for l in ut.FEAT_NAMES]], keys, trim_file, encodings={keys[0]: 'trim'})
+		with dare.DataReader(self.dir_path) as reader:
+			index = fi.FeatureIndex.build(reader, flist=[trim_file])
+		with h5py.File(trim_file, 'r') as f:
+			self.assertNotEqual(f['jetConstituentsList'].chunks[0], f['eventFeatures'].chunks[0])
+			self.assertEqual(index.get_entry(trim_file)['chunk_rows'], f['eventFeatures'].chunks[0])
+
+
+	def test_estimate_and_stale_entries(self):
+		reader = dare.DataReader(self.dir_path)
+		cuts = {'mJJ': 1100.}
+		estimate_n, unindexed = reader.estimate_events_in_dir(**cuts)
+		features, _ = reader.read_jet_features_from_dir(**cuts)
+		self.assertEqual(unindexed, [])
+		self.assertAlmostEqual(estimate_n / len(features), 1., delta=0.1)
+		os.utime(self.flist[0], (0, 0))
+		self.assertIsNone(fi.FeatureIndex.load(self.dir_path).selected_row_ranges(self.flist[0], **cuts))
+		self.assertEqual(reader.estimate_events_in_dir(**cuts)[1], [self.flist[0]])
+
+
+
+if __name__ == '__main__':
+	unittest.main()
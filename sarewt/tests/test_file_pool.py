@@ -0,0 +1,96 @@
+import unittest
+import tempfile
+from unittest import mock
+import numpy as np
+import sarewt.data_reader as dare
+import sarewt.file_pool as fp
+import sarewt.sample_generator as sage
+
+
+
+class H5FilePoolTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.flist = sage.write_dijet_sample_dir(self.tmp_dir.name, n_files=3, events_per_file=20, seed=1)
+
+	def tearDown(self):
+		self.tmp_dir.cleanup()
+
+
+	def use(self, pool, path):
+		with pool.open(path) as f:
+			return f
+
+
+	def test_lru_eviction_closes_handles(self):
+		with fp.H5FilePool(max_open=2) as pool:
+			f0 = self.use(pool, self.flist[0])
+			self.assertIs(self.use(pool, self.flist[0]), f0)
+			f1 = self.use(pool, self.flist[1])
+			self.use(pool, self.flist[0]) # f0 most recently used => f1 evicted next
+			self.use(pool, self.flist[2])
+			self.assertEqual(len(pool), 2)
+			self.assertNotIn(self.flist[1], pool)
+			self.assertFalse(f1.id.valid)
+			self.assertTrue(f0.id.valid)
+		self.assertEqual(len(pool), 0)
+		self.assertFalse(f0.id.valid)
+
+
+	def test_reader_opens_each_file_once(self):
+		pool = fp.H5FilePool(rdcc_nbytes=4*1024**2)
+		opened = []
+		open_file = pool._open
+		pool._open = lambda path: opened.append(path) or open_file(path)
+		with dare.DataReader(self.tmp_dir.name, file_pool=pool) as reader:
+			features, names = reader.read_jet_features_from_dir(features_to_df=True)
+			constituents, _, features_2, _ = reader.read_events_from_dir()
+			self.assertEqual(len(features), 60)
+			np.testing.assert_array_equal(features.values, features_2)
+		self.assertEqual(sorted(opened), self.flist)
+		self.assertEqual(len(pool), 0)
+
+
+
+	def test_checked_out_handles_not_evicted(self):
+		with fp.H5FilePool(max_open=1) as pool:
+			with pool.open(self.flist[0]) as f0:
+				self.use(pool, self.flist[1])
+				self.use(pool, self.flist[2])
+				self.assertTrue(f0.id.valid)
+				self.assertEqual(len(f0['eventFeatures']), 20)
+			self.assertEqual(len(pool), 1)
+			self.assertFalse(f0.id.valid)
+
+
+	def test_reader_without_pool_closes_files(self):
+		import sarewt.data_writer as dw
+		reader = dare.DataReader(self.flist[0])
+		constituents, features = reader.read_events_from_file()
+		self.assertEqual(len(reader.file_pool), 0)
+		names = [l.encode('utf-8') for l in reader.read_labels()]
+		dw.write_data_to_file([features[:5], names], ['eventFeatures', 'eventFeatureNames'], self.flist[0]) # overwrite file just read
+		np.testing.assert_array_equal(dare.DataReader(self.flist[0]).read_jet_features_from_file(), features[:5])
+		with dare.DataReader(self.flist[1]) as reader:
+			reader.read_events_from_file()
+			self.assertEqual(len(reader.file_pool), 1)
+		self.assertEqual(len(reader.file_pool), 0)
+		reader.read_events_from_file()
+		self.assertEqual(len(reader.file_pool), 0)
+
+
+	def test_reader_without_pool_opens_file_once_per_call(self):
+		reader = dare.DataReader(self.tmp_dir.name)
+		opened = []
+		open_file = reader.file_pool._open
+		with mock.patch.object(reader.file_pool, '_open', side_effect=lambda path: opened.append(path) or open_file(path)):
+			reader.read_labels_from_file(self.flist[0])
+			self.assertEqual(opened, self.flist[:1])
+			reader.read_jet_features_from_file(self.flist[1], features_to_df=True)
+			self.assertEqual(opened, self.flist[:2])
+		self.assertEqual(len(reader.file_pool), 0)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,63 @@
+import os
+import unittest
+import tempfile
+import numpy as np
+import sarewt.data_reader as dare
+import sarewt.sample_generator as sage
+import sarewt.util as ut
+
+try:
+	import sarewt.parquet_io as paio
+except ImportError:
+	paio = None
+
+
+
+@unittest.skipIf(paio is None, 'pyarrow not installed')
+class ParquetIOTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.in_dir = os.path.join(self.tmp_dir.name, 'h5')
+		self.out_dir = os.path.join(self.tmp_dir.name, 'parquet')
+		sage.write_dijet_sample_dir(self.in_dir, n_files=3, events_per_file=500, seed=1)
+		with dare.DataReader(self.in_dir) as reader:
+			self.written = paio.export_features_to_parquet(reader, self.out_dir, row_group_size=100)
+
+	def tearDown(self):
+		self.tmp_dir.cleanup()
+
+
+	def test_read_features_with_cuts(self):
+		self.assertEqual(len(self.written), 3)
+		reader = paio.ParquetFeatureReader(self.out_dir)
+		self.assertEqual(reader.feature_names, ut.FEAT_NAMES)
+		for cuts in [{}, {'mJJ': 1100.}, {'mJJ': 1100., 'sideband': 1.4}, {'signalregion': 1.4, 'j1Pt': 300., 'j2Pt': 200.}, {'jXPt': 300., 'j1Eta': 1., 'j2Eta': 2.4}]:
+			features_h5, names = dare.DataReader(self.in_dir).read_jet_features_from_dir(**cuts)
+			features, names_pq = reader.read_jet_features(**cuts)
+			self.assertEqual(names_pq, names)
+			np.testing.assert_array_equal(features, features_h5)
+
+		features_h5, _ = dare.DataReader(self.in_dir).read_jet_features_from_dir(sideband=1.4)
+		df, _ = reader.read_jet_features(columns=['mJJ', 'j1Pt'], features_to_df=True, sideband=1.4)
+		self.assertEqual(list(df.columns), ['mJJ', 'j1Pt'])
+		np.testing.assert_array_equal(df.values, features_h5[:, [ut.FEAT_IDX['mJJ'], ut.FEAT_IDX['j1Pt']]])
+		features, _ = reader.read_jet_features(read_n=42, mJJ=1100.)
+		self.assertEqual(len(features), 42)
+		counts, edges = reader.histogram('mJJ', bins=10, range=(1000., 3000.), sideband=1.4)
+		np.testing.assert_array_equal(counts, np.histogram(features_h5[:, ut.FEAT_IDX['mJJ']], bins=10, range=(1000., 3000.))[0])
+
+
+	def test_export_case(self):
+		case_dir, out_dir = os.path.join(self.tmp_dir.name, 'case'), os.path.join(self.tmp_dir.name, 'case_parquet')
+		sage.write_case_sample_dir(case_dir, n_files=2, events_per_file=50, seed=2)
+		with dare.CaseDataReader(case_dir) as reader:
+			paio.export_features_to_parquet(reader, out_dir)
+			features, names = paio.ParquetFeatureReader(out_dir).read_jet_features()
+			self.assertEqual(names, reader.dijet_feature_names_val + ['truth_label'])
+		self.assertEqual(features.shape, (100, 15))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
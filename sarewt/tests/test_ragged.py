@@ -0,0 +1,75 @@
+import os
+import unittest
+import tempfile
+import numpy as np
+import sarewt.data_reader as dare
+import sarewt.ragged as ra
+import sarewt.sample_generator as sage
+import sarewt.event_to_image_serialization as eis
+import sarewt.scripts.convert_to_ragged as ctr
+
+
+
+class RaggedConstituentsTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.constituents = sage.generate_jet_constituents(200, rng=np.random.default_rng(1))
+		self.ragged = ra.RaggedConstituents.from_padded(self.constituents)
+
+	def tearDown(self):
+		self.tmp_dir.cleanup()
+
+
+	def test_from_and_to_padded(self):
+		self.assertEqual(len(self.ragged), 200)
+		self.assertEqual(len(self.ragged.particles), np.sum(self.constituents[..., 2] > 0))
+		self.assertLess(self.ragged.nbytes, self.constituents.nbytes)
+		np.testing.assert_array_equal(self.ragged.to_padded(), self.constituents)
+		np.testing.assert_array_equal(self.ragged.to_padded(n_particles=10), self.constituents[:, :, :10])
+
+
+	def test_select_and_concatenate(self):
+		mask = self.constituents[:, 0, 0, 2] > 5.
+		np.testing.assert_array_equal(self.ragged[mask].to_padded(), self.constituents[mask])
+		np.testing.assert_array_equal(self.ragged[[5, 2, 7]].to_padded(), self.constituents[[5, 2, 7]])
+		np.testing.assert_array_equal(self.ragged[3].to_padded(), self.constituents[3:4])
+		concat = ra.RaggedConstituents.concatenate([self.ragged[:50], self.ragged[50:120], self.ragged[120:]])
+		np.testing.assert_array_equal(concat.to_padded(), self.constituents)
+		particles_j2, event_idx = self.ragged.jet(1)
+		np.testing.assert_array_equal(particles_j2, self.constituents[:, 1][self.constituents[:, 1, :, 2] > 0])
+		np.testing.assert_array_equal(np.bincount(event_idx, minlength=200), self.ragged.multiplicity[:, 1])
+
+
+	def test_ragged_images_equal_padded_images(self):
+		serializer = eis.ImageSerializer(32)
+		images_padded = serializer.convert_events_to_image(self.constituents[:, 0], self.constituents[:, 1])
+		images_ragged = serializer.convert_ragged_events_to_image(self.ragged)
+		for img_padded, img_ragged in zip(images_padded, images_ragged):
+			np.testing.assert_allclose(img_ragged, img_padded, rtol=1e-5)
+
+
+	def test_write_convert_and_read(self):
+		in_dir, out_dir = os.path.join(self.tmp_dir.name, 'padded'), os.path.join(self.tmp_dir.name, 'ragged')
+		sage.write_dijet_sample_dir(in_dir, n_files=3, events_per_file=100, seed=2)
+		ctr.convert_dir_to_ragged(in_dir, out_dir)
+		cuts = {'mJJ': 1100.}
+		constituents, names, features, _ = dare.DataReader(in_dir).read_events_from_dir(**cuts)
+		ragged, names_ragged, features_ragged, _ = dare.DataReader(out_dir).read_ragged_events_from_dir(**cuts)
+		self.assertEqual(names_ragged, names)
+		np.testing.assert_array_equal(features_ragged, features)
+		np.testing.assert_array_equal(ragged.to_padded(), constituents)
+		# padded readers pad ragged files on demand
+		constituents_padded, _, _, _ = dare.DataReader(out_dir).read_events_from_dir(**cuts)
+		np.testing.assert_array_equal(constituents_padded, constituents)
+		# chunks
+		parts = list(dare.DataReader(out_dir).generate_ragged_event_parts_from_dir(parts_n=70, **cuts))
+		self.assertTrue(all(len(c) == len(f) <= 70 for c, f in parts))
+		np.testing.assert_array_equal(ra.RaggedConstituents.concatenate([c for c, _ in parts]).to_padded(), constituents)
+		padded_parts = list(dare.DataReader(out_dir).generate_ragged_event_parts_from_dir(parts_n=70, pad=True, **cuts))
+		np.testing.assert_array_equal(np.concatenate([c for c, _ in padded_parts]), constituents)
+
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+import tempfile
+import numpy as np
+import sarewt.data_reader as dare
+import sarewt.sample_generator as sage
+
+
+
+class SampleGeneratorTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.dir_path = self.tmp_dir.name
+		self.n_files, self.events_per_file = 3, 200
+		self.flist = sage.write_dijet_sample_dir(self.dir_path, n_files=self.n_files, events_per_file=self.events_per_file, seed=1)
+		self.reader = dare.DataReader(self.dir_path)
+
+	def tearDown(self):
+		self.tmp_dir.cleanup()
+
+
+	def test_constituents_padded_and_pt_sorted(self):
+		constituents = sage.generate_jet_constituents(50, rng=np.random.default_rng(3))
+		self.assertEqual(constituents.shape, (50, 2, 100, 3))
+		pt = constituents[..., 2]
+		self.assertTrue(np.all(np.diff(pt, axis=-1) <= 0)) # descending pt, zero padding at the end
+		self.assertTrue(np.all(np.abs(constituents[..., :2]) <= 0.8))
+
+
+	def test_read_generated_dir(self):
+		self.assertEqual(self.reader.get_file_list(), self.flist)
+		constituents, constituents_names, features, features_names = self.reader.read_events_from_dir()
+		self.assertEqual(constituents.shape, (self.n_files*self.events_per_file, 2, 100, 3))
+		self.assertEqual(features.shape, (self.n_files*self.events_per_file, 11))
+		self.assertEqual(len(constituents_names), 3)
+		self.assertEqual(features_names, sage.ut.FEAT_NAMES)
+
+
+	def test_events_generated_by_size(self):
+		parts_sz_mb = 0.5
+		read_events_n = 0
+		for (constituents, features) in self.reader.generate_event_parts_from_dir(parts_sz_mb=parts_sz_mb):
+			self.assertEqual(len(constituents), len(features))
+			self.assertGreater(len(constituents), 0)
+			self.assertLessEqual((constituents.nbytes + features.nbytes) / 1024**2, parts_sz_mb)
+			read_events_n += len(features)
+		self.assertEqual(read_events_n, self.n_files*self.events_per_file)
+
+
+	def test_read_generated_case_dir(self):
+		case_dir = tempfile.mkdtemp(dir=self.dir_path)
+		sage.write_case_sample_dir(case_dir, n_files=2, events_per_file=50, seed=2)
+		constituents, _, features, _, truth_labels = dare.CaseDataReader(case_dir).read_events_from_dir()
+		self.assertEqual(constituents.shape, (100, 2, 100, 4))
+		self.assertEqual(features.shape, (100, 14))
+		self.assertEqual(len(truth_labels), 100)
+
+
+
+if __name__ == '__main__':
+	unittest.main()